@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+LifeLink - storage and matching benchmarks
+Seeds a dataset of each requested size with generate_sample_data in a
+scratch directory, then times the storage hot paths, matching, the
+notification fan-out and every Flask route through the test client. Each
+size runs in its own process so caches and data never leak between sizes.
+
+Results are written as JSON; pass an earlier results file with --compare to
+fail (exit 1) when any case got slower than the threshold allows.
+
+Usage: python benchmark.py --sizes 1000,100000 [--output results.json]
+                           [--compare baseline.json --threshold 0.2]
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Requests generated per donor when seeding
+REQUESTS_PER_DONOR = 0.1
+
+# Requests rotated through by the matching and fan-out cases
+SAMPLE_REQUESTS = 50
+
+def _import_modules():
+    """Import the app and generator from the repository while working in the scratch directory"""
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    import blood_donation_app_csv
+    import generate_sample_data
+    return blood_donation_app_csv, generate_sample_data
+
+def summarize(samples):
+    """Timing statistics in milliseconds for a list of durations in seconds"""
+    samples = sorted(sample * 1000 for sample in samples)
+    return {
+        'runs': len(samples),
+        'min_ms': round(samples[0], 4),
+        'median_ms': round(statistics.median(samples), 4),
+        'mean_ms': round(statistics.fmean(samples), 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        'max_ms': round(samples[-1], 4)
+    }
+
+def time_case(func, repeat, setup=None, warmup=1):
+    """Time func over repeat runs, passing it whatever setup returns (untimed)"""
+    samples = []
+    for run in range(warmup + repeat):
+        argument = setup() if setup else None
+        started = time.perf_counter()
+        func(argument)
+        elapsed = time.perf_counter() - started
+        if run >= warmup:
+            samples.append(elapsed)
+    return summarize(samples)
+
+def _donor_form(number):
+    return {
+        'name': f'Bench Donor {number}', 'email': f'bench{number}@example.com',
+        'phone': '+91-9000000000', 'age': '30', 'gender': 'female', 'city': 'Mumbai',
+        'address': '1 MG Road, Mumbai', 'blood_group': 'O-', 'organs': ['Kidney']
+    }
+
+def _request_form(request_data):
+    form = {field: str(request_data.get(field) or '') for field in (
+        'patient_name', 'contact_person', 'phone', 'email', 'city', 'hospital',
+        'type', 'urgency', 'quantity', 'max_distance', 'blood_group', 'organ')}
+    form['patient_name'] = 'Bench Patient'
+    return form
+
+def run_size(num_donors, seed, repeat, results):
+    """Seed a dataset of num_donors donors and time every case against it"""
+    lifelink, generator = _import_modules()
+    num_requests = max(1, int(num_donors * REQUESTS_PER_DONOR))
+
+    started = time.perf_counter()
+    generator.write_sample_data(num_donors, num_requests, seed, progress_every=None)
+    seed_seconds = time.perf_counter() - started
+    lifelink.warm_table_cache()
+
+    requests = [r for r in lifelink.read_csv_data('active_requests').values() if r['status'] == 'active']
+    sample = requests[:SAMPLE_REQUESTS]
+    active_ids = {r['id'] for r in requests}
+    pending = [n for n in lifelink.read_csv_data('notifications').values()
+               if n['status'] == 'pending' and n['request_id'] in active_ids]
+    some_donor = next(iter(lifelink.read_csv_data('donors')))
+    counter = itertools.count()
+    rotating_requests = itertools.cycle(sample)
+    cases = {}
+
+    # Storage
+    cases['read_csv_data.donors.cold'] = time_case(
+        lambda _: lifelink.read_csv_data('donors'), repeat, setup=lifelink.storage.clear_cache)
+    cases['read_csv_data.notifications.cold'] = time_case(
+        lambda _: lifelink.read_csv_data('notifications'), repeat, setup=lifelink.storage.clear_cache)
+    cases['read_csv_data.donors.warm'] = time_case(lambda _: lifelink.read_csv_data('donors'), repeat)
+    cases['add_csv_record.donors'] = time_case(
+        lambda number: lifelink.add_csv_record('donors', {
+            'id': f'bench-donor-{number}', 'name': 'Bench', 'city': 'Mumbai', 'blood_group': 'O-',
+            'organs': [], 'available': False, 'registered_date': datetime.now().isoformat()}),
+        repeat, setup=lambda: next(counter))
+    cases['update_csv_record.active_requests'] = time_case(
+        lambda request_data: lifelink.update_csv_record(
+            'active_requests', request_data['id'], {'additional_info': 'benchmark'}),
+        repeat, setup=lambda: next(rotating_requests))
+    snapshot = dict(lifelink.read_csv_data('accepted_matches'))
+    cases['write_csv_data.accepted_matches'] = time_case(
+        lambda _: lifelink.write_csv_data('accepted_matches', snapshot), repeat)
+
+    # Matching and fan-out
+    cases['find_compatible_donors'] = time_case(
+        lambda request_data: lifelink.find_compatible_donors(request_data),
+        repeat, setup=lambda: next(rotating_requests))
+    cases['find_compatible_donors.top_k'] = time_case(
+        lambda request_data: lifelink.find_compatible_donors(request_data, limit=lifelink.match_limit(request_data)),
+        repeat, setup=lambda: next(rotating_requests))
+
+    # A critical request matched while moderate and batch matching is queued
+    def spike_setup():
+        lifelink.drain_notification_queue()
+        for request_data in sample:
+            for priority in ('moderate', 'batch'):
+                lifelink.scheduler.submit(priority, lifelink.find_compatible_donors, request_data)
+        return next(rotating_requests)
+    cases['scheduler.critical_match_under_load'] = time_case(
+        lambda request_data: lifelink.scheduler.submit(
+            'critical', lifelink.find_compatible_donors, request_data, lifelink.match_limit(request_data)).result(),
+        repeat, setup=spike_setup)
+    lifelink.drain_notification_queue()
+
+    def fanout_setup():
+        request_data = dict(next(rotating_requests), id=f'bench-request-{next(counter)}')
+        return request_data, lifelink.find_compatible_donors(request_data)
+    cases['send_notifications_to_donors'] = time_case(
+        lambda arguments: lifelink.send_notifications_to_donors(*arguments), repeat, setup=fanout_setup)
+
+    # Routes
+    client = lifelink.app.test_client()
+    with client.session_transaction() as session:
+        session['donor_id'] = some_donor
+
+    def get(path):
+        return lambda _: client.get(path)
+    for name, path in [('home', '/'), ('all_donors', '/all_donors'), ('all_requests', '/all_requests'),
+                       ('api_stats', '/api/stats'), ('donor_dashboard', '/donor_dashboard'),
+                       ('request_status', f"/request_status/{sample[0]['id']}")]:
+        cases[f'route.{name}'] = time_case(get(path), repeat)
+    def submit_setup():
+        # Earlier fan-outs finish before the next request is timed
+        lifelink.drain_notification_queue()
+        return next(rotating_requests)
+    cases['route.submit_request'] = time_case(
+        lambda request_data: client.post('/submit_request', data=_request_form(request_data)),
+        repeat, setup=submit_setup)
+    lifelink.drain_notification_queue()
+
+    def accept_setup():
+        notification = pending.pop()
+        with client.session_transaction() as session:
+            session['donor_id'] = notification['donor_id']
+        return notification
+    if len(pending) > repeat:
+        cases['route.accept_request'] = time_case(
+            lambda notification: client.post('/accept_request', data={
+                'request_id': notification['request_id'], 'notification_id': notification['id']}),
+            repeat, setup=accept_setup)
+    cases['route.submit_donor'] = time_case(
+        lambda number: client.post('/submit_donor', data=_donor_form(number)),
+        repeat, setup=lambda: next(counter))
+
+    results.put({'donors': num_donors, 'requests': num_requests,
+                 'seed_seconds': round(seed_seconds, 2), 'cases': cases})
+
+def _run_in_scratch_dir(num_donors, seed, repeat, keep):
+    """Run one size in a fresh process working in its own scratch directory"""
+    data_root = tempfile.mkdtemp(prefix=f'lifelink-bench-{num_donors}-')
+    previous = os.getcwd()
+    os.chdir(data_root)
+    try:
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        process = context.Process(target=run_size, args=(num_donors, seed, repeat, results))
+        process.start()
+        result = results.get()
+        process.join()
+        return result
+    finally:
+        os.chdir(previous)
+        if keep:
+            print(f"   data kept in {data_root}")
+        else:
+            shutil.rmtree(data_root, ignore_errors=True)
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, baseline, threshold, min_delta_ms):
+    """List the cases whose median got slower than the baseline allows"""
+    regressions = []
+    for size, result in current['results'].items():
+        previous = baseline.get('results', {}).get(size)
+        if not previous:
+            continue
+        for case, timing in result['cases'].items():
+            before = previous['cases'].get(case)
+            if not before:
+                continue
+            now_ms, then_ms = timing['median_ms'], before['median_ms']
+            if now_ms > then_ms * (1 + threshold) and now_ms - then_ms > min_delta_ms:
+                regressions.append((size, case, then_ms, now_ms))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LifeLink storage, matching and routes")
+    parser.add_argument('--sizes', default='1000,10000',
+                        help="comma-separated donor counts; requests are a tenth of that")
+    parser.add_argument('--repeat', type=int, default=20, help="timed runs per case")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', help="results file from an earlier run to check against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="allowed slowdown of a case's median before it counts as a regression")
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help="ignore slowdowns smaller than this, which are mostly noise")
+    parser.add_argument('--keep', action='store_true', help="keep the seeded data directories")
+    args = parser.parse_args()
+
+    current = {
+        'meta': {
+            'commit': _git_commit(),
+            'date': datetime.now().isoformat(),
+            'storage': os.environ.get('LIFELINK_STORAGE', 'csv'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'seed': args.seed
+        },
+        'results': {}
+    }
+
+    for size in [int(size) for size in args.sizes.split(',')]:
+        print(f"Benchmarking {size:,} donors ({current['meta']['storage']} backend)...")
+        result = _run_in_scratch_dir(size, args.seed, args.repeat, args.keep)
+        current['results'][str(size)] = result
+        print(f"   seeded in {result['seed_seconds']}s")
+        for case, timing in result['cases'].items():
+            print(f"   {case:<40} median {timing['median_ms']:>10.3f} ms   p95 {timing['p95_ms']:>10.3f} ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(current, output, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('meta', {}).get('storage') != current['meta']['storage']:
+            print(f"Warning: {args.compare} was measured on the "
+                  f"{baseline.get('meta', {}).get('storage')} backend")
+        regressions = compare(current, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"REGRESSIONS against {args.compare} (threshold {args.threshold:.0%}):")
+            for size, case, then_ms, now_ms in regressions:
+                print(f"  - {size} donors, {case}: {then_ms:.3f} ms -> {now_ms:.3f} ms")
+            sys.exit(1)
+        print(f"OK: no case slower than {args.compare} by more than {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,34 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, g
+from flask import before_render_template, template_rendered
 from datetime import datetime, timedelta
 import uuid
 import random
 import csv
+import io
 import os
+import sys
+import time
 import json
-from math import radians, cos, sin, asin, sqrt
+import multiprocessing
+import sqlite3
+import atexit
+import threading
+from contextlib import contextmanager
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import Future
+from itertools import islice
+from math import radians, degrees, cos, sin, asin, sqrt, floor, pi
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; locking is then in-process only
+    fcntl = None
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; matching falls back to pure Python
+    np = None
 
 app = Flask(__name__)
 app.secret_key = 'blood_organ_donation_secret_2025'
@@ -17,7 +40,9 @@ CSV_FILES = {
     'blood_banks': 'data/blood_banks.csv',
     'active_requests': 'data/active_requests.csv',
     'notifications': 'data/notifications.csv',
-    'accepted_matches': 'data/accepted_matches.csv'
+    'accepted_matches': 'data/accepted_matches.csv',
+    'archived_requests': 'data/archived_requests.csv',
+    'archived_notifications': 'data/archived_notifications.csv'
 }
 
 # Create data directory if it doesn't exist
@@ -26,124 +51,1827 @@ if not os.path.exists('data'):
 
 # CSV field definitions
 CSV_FIELDS = {
-    'donors': ['id', 'name', 'email', 'phone', 'age', 'gender', 'city', 'address', 
+    'donors': ['id', 'name', 'email', 'phone', 'age', 'gender', 'city', 'address', 'lat', 'lon',
                'blood_group', 'organs', 'medical_history', 'last_donation', 'available', 'registered_date'],
     'recipients': ['id', 'name', 'email', 'phone', 'age', 'gender', 'city', 'address', 
                    'blood_group', 'organ_needed', 'urgency', 'registered_date'],
     'blood_banks': ['id', 'name', 'city', 'address', 'phone', 'email', 'contact_person'],
     'active_requests': ['id', 'patient_name', 'contact_person', 'phone', 'email', 'city', 
-                        'hospital', 'type', 'blood_group', 'organ', 'urgency', 'quantity', 
+                        'hospital', 'lat', 'lon', 'type', 'blood_group', 'organ', 'urgency', 'quantity', 
                         'max_distance', 'additional_info', 'status', 'matched_donor', 'created_date'],
     'notifications': ['id', 'donor_id', 'request_id', 'message', 'distance', 'timestamp', 'status'],
     'accepted_matches': ['id', 'donor_id', 'request_id', 'matched_date', 'status']
 }
+# Closed requests and their notifications are moved here by compaction
+CSV_FIELDS['archived_requests'] = CSV_FIELDS['active_requests']
+CSV_FIELDS['archived_notifications'] = CSV_FIELDS['notifications']
+
+# Row-level changes are appended to a per-table update log instead of
+# rewriting the whole table; reads fold the log into the parsed rows
+UPDATE_LOG_FILES = {file_type: filepath[:-len('.csv')] + '_updates.csv'
+                    for file_type, filepath in CSV_FILES.items()}
+UPDATE_LOG_FIELDS = ['id', 'field', 'value']
+
+# Once an update log grows past this size a batch scheduler job rewrites
+# the table with the changes folded in, and the log starts over
+UPDATE_LOG_COMPACT_BYTES = 256 * 1024
+
+def _csv_header(filepath):
+    """The header row of a CSV file"""
+    with open(filepath, 'r', newline='', encoding='utf-8') as csvfile:
+        return next(csv.reader(csvfile), [])
 
 def init_csv_files():
-    """Initialize CSV files with headers if they don't exist"""
+    """Initialize CSV files with headers if they don't exist
+
+    A file written before its table gained columns (such as lat/lon) is
+    rewritten once with the current header and those columns left empty.
+    """
     for file_type, filepath in CSV_FILES.items():
         if not os.path.exists(filepath):
             with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
                 writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDS[file_type])
                 writer.writeheader()
+        elif _csv_header(filepath) != CSV_FIELDS[file_type]:
+            with table_lock(file_type):
+                # Another worker may have upgraded it while we waited
+                if _csv_header(filepath) != CSV_FIELDS[file_type]:
+                    _csv_write_table(file_type, _csv_read_table(file_type))
+
+# Request timings and storage/matching counters, served at /metrics in the
+# Prometheus text format. Collection is off unless LIFELINK_METRICS is set;
+# while off `metrics` is None and each instrumented spot costs one check.
+METRIC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_DESCRIPTIONS = {
+    'lifelink_http_request_duration_seconds': ('histogram', 'Time spent handling a request'),
+    'lifelink_template_render_seconds': ('histogram', 'Time spent rendering a template'),
+    'lifelink_storage_load_seconds': ('histogram', 'Time spent bringing a table up to date for a read'),
+    'lifelink_storage_files_opened_total': ('counter', 'Table and update log files opened for reading'),
+    'lifelink_storage_bytes_read_total': ('counter', 'Bytes read from table and update log files'),
+    'lifelink_storage_rows_parsed_total': ('counter', 'Rows parsed and converted from storage'),
+    'lifelink_storage_cache_hits_total': ('counter', 'Reads served from or extending the cached table'),
+    'lifelink_storage_cache_misses_total': ('counter', 'Reads that had to parse a whole table'),
+    'lifelink_storage_rows_written_total': ('counter', 'Rows appended or rewritten'),
+    'lifelink_storage_updates_written_total': ('counter', 'Field changes written to update logs'),
+    'lifelink_match_candidates_scanned_total': ('counter', 'Donors looked at by find_compatible_donors'),
+    'lifelink_match_donors_found_total': ('counter', 'Compatible donors returned by find_compatible_donors'),
+    'lifelink_rematch_notifications_total': ('counter', 'Donors notified by re-matching, on registration or in batch'),
+    'lifelink_rematch_seconds': ('histogram', 'Time taken by one batch re-match of the active requests'),
+    'lifelink_scheduler_queue_depth': ('gauge', 'Jobs waiting in a scheduler priority queue'),
+    'lifelink_scheduler_wait_seconds': ('histogram', 'Time a job waited in its priority queue before a worker took it'),
+    'lifelink_scheduler_job_seconds': ('histogram', 'Time a scheduler worker spent running a job'),
+    'lifelink_scheduler_inline_jobs_total': ('counter', 'Jobs run by the caller because their priority queue was full')
+}
 
-def read_csv_data(file_type):
-    """Read data from CSV file and return as dictionary"""
-    data = {}
+class Metrics:
+    """Thread-safe counters, gauges and histograms, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> total
+        self._gauges = {}  # (name, labels) -> current value
+        self._histograms = {}  # (name, labels) -> [count per bucket..., +Inf count, sum]
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(METRIC_BUCKETS) + 1) + [0.0]
+            histogram[bisect_left(METRIC_BUCKETS, value)] += 1
+            histogram[-1] += value
+
+    def render(self):
+        """All metrics as Prometheus exposition text"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+
+        def label_text(labels, extra=()):
+            pairs = [name + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+                     for name, value in labels + tuple(extra)]
+            return '{' + ','.join(pairs) + '}' if pairs else ''
+
+        lines = []
+        for name, (metric_type, description) in METRIC_DESCRIPTIONS.items():
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} {metric_type}']
+            if metric_type in ('counter', 'gauge'):
+                series = counters if metric_type == 'counter' else gauges
+                for (metric, labels), value in sorted(series.items()):
+                    if metric == name:
+                        lines.append(f'{name}{label_text(labels)} {value}')
+            else:
+                for (metric, labels), values in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(METRIC_BUCKETS + ('+Inf',), values):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{label_text(labels, [("le", bound)])} {cumulative}')
+                    lines.append(f'{name}_sum{label_text(labels)} {values[-1]}')
+                    lines.append(f'{name}_count{label_text(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+metrics = None
+
+# Parsed tables kept in memory between requests, keyed by file type
+_table_cache = {}
+_table_cache_lock = threading.Lock()
+
+# Held by anything in this process that writes to a table or its update log
+_table_write_locks = {file_type: threading.RLock() for file_type in CSV_FILES}
+
+# Tables whose lock the current thread already holds, mapped to whether the
+# hold is exclusive, so nested calls (compaction reading the table it is
+# rewriting) do not deadlock against their own flock
+_held_table_locks = threading.local()
+
+def _flock(path, exclusive):
+    """Open a lock file and flock it; returns the descriptor, or None without fcntl"""
+    if fcntl is None:
+        return None
+    lock_fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    fcntl.flock(lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    return lock_fd
+
+@contextmanager
+def table_lock(file_type, exclusive=True):
+    """Hold a table's writer lock (exclusive) or reader lock, shared with other worker processes
+
+    Writers take flock on a .write.lock file next to the table, plus an RLock
+    for the threads of this process, and hold it for the whole write.
+    Readers take a shared flock on a .lock file, which covers both the table
+    and its update log. Writers exclude readers only for the moment a new
+    table file is swapped in (see _replace_csv_file), so a long rewrite never
+    blocks reads. Always take a table lock before _table_cache_lock, never after.
+    """
+    held = getattr(_held_table_locks, 'tables', None)
+    if held is None:
+        held = _held_table_locks.tables = {}
+    if file_type in held:
+        if exclusive and not held[file_type]:
+            raise RuntimeError(f"Cannot upgrade a shared lock on {file_type}")
+        yield
+        return
+
+    thread_lock = _table_write_locks[file_type] if exclusive else None
+    if thread_lock:
+        thread_lock.acquire()
+    lock_fd = None
+    try:
+        lock_fd = _flock(CSV_FILES[file_type] + ('.write.lock' if exclusive else '.lock'), exclusive)
+        held[file_type] = exclusive
+        try:
+            yield
+        finally:
+            del held[file_type]
+    finally:
+        if lock_fd is not None:
+            os.close(lock_fd)  # Closing the descriptor releases the flock
+        if thread_lock:
+            thread_lock.release()
+
+@contextmanager
+def _readers_excluded(file_type):
+    """Keep readers in every process out of a table while its files are swapped
+
+    Only taken by a writer already holding the table's writer lock.
+    """
+    lock_fd = _flock(CSV_FILES[file_type] + '.lock', True)
+    try:
+        yield
+    finally:
+        if lock_fd is not None:
+            os.close(lock_fd)
+
+# Bumped whenever this process rewrites a table so the cached copy is
+# reparsed from scratch; plain appends are picked up by the tail reader
+_write_generation = {file_type: 0 for file_type in CSV_FILES}
+
+# Cities in India for location selection
+CITIES = [
+    'Mumbai', 'Delhi', 'Bangalore', 'Chennai', 'Kolkata', 'Hyderabad',
+    'Pune', 'Ahmedabad', 'Jaipur', 'Lucknow', 'Kanpur', 'Nagpur',
+    'Indore', 'Thane', 'Bhopal', 'Visakhapatnam', 'Pimpri', 'Patna'
+]
+
+EARTH_RADIUS_KM = 6371
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Calculate distance between two coordinates using Haversine formula"""
+    # Convert decimal degrees to radians
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+
+    # Haversine formula
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    c = 2 * asin(sqrt(a))
+    return c * EARTH_RADIUS_KM
+
+# Approximate coordinates for Indian cities
+CITY_COORDINATES = {
+    'Mumbai': (19.0760, 72.8777),
+    'Delhi': (28.7041, 77.1025),
+    'Bangalore': (12.9716, 77.5946),
+    'Chennai': (13.0827, 80.2707),
+    'Kolkata': (22.5726, 88.3639),
+    'Hyderabad': (17.3850, 78.4867),
+    'Pune': (18.5204, 73.8567),
+    'Ahmedabad': (23.0225, 72.5714),
+    'Jaipur': (26.9124, 75.7873),
+    'Lucknow': (26.8467, 80.9462),
+    'Kanpur': (26.4499, 80.3319),
+    'Nagpur': (21.1458, 79.0882),
+    'Indore': (22.7196, 75.8577),
+    'Thane': (19.2183, 72.9781),
+    'Bhopal': (23.2599, 77.4126),
+    'Visakhapatnam': (17.6868, 83.2185),
+    'Pimpri': (18.6298, 73.8131),
+    'Patna': (25.5941, 85.1376)
+}
+
+# Well-known localities within the cities, for placing an address more
+# precisely than its city centre. Names are matched case-insensitively
+# anywhere in the address; the longest match wins.
+LOCALITY_COORDINATES = {
+    'Mumbai': {
+        'Andheri': (19.1136, 72.8697), 'Bandra': (19.0596, 72.8295), 'Borivali': (19.2307, 72.8567),
+        'Chembur': (19.0522, 72.9005), 'Colaba': (18.9067, 72.8147), 'Dadar': (19.0178, 72.8478),
+        'Powai': (19.1176, 72.9060)
+    },
+    'Delhi': {
+        'Connaught Place': (28.6315, 77.2167), 'Dwarka': (28.5921, 77.0460), 'Karol Bagh': (28.6519, 77.1909),
+        'Lajpat Nagar': (28.5677, 77.2433), 'Rohini': (28.7383, 77.0822), 'Saket': (28.5245, 77.2066)
+    },
+    'Bangalore': {
+        'Electronic City': (12.8452, 77.6602), 'Indiranagar': (12.9784, 77.6408), 'Jayanagar': (12.9250, 77.5938),
+        'Koramangala': (12.9352, 77.6245), 'Whitefield': (12.9698, 77.7500), 'Yelahanka': (13.1007, 77.5963)
+    },
+    'Chennai': {
+        'Adyar': (13.0012, 80.2565), 'Anna Nagar': (13.0850, 80.2101), 'T. Nagar': (13.0418, 80.2341),
+        'Tambaram': (12.9249, 80.1000), 'Velachery': (12.9815, 80.2180)
+    },
+    'Kolkata': {
+        'Ballygunge': (22.5265, 88.3650), 'Dum Dum': (22.6200, 88.4200), 'Howrah': (22.5958, 88.2636),
+        'Park Street': (22.5535, 88.3520), 'Salt Lake': (22.5867, 88.4171)
+    },
+    'Hyderabad': {
+        'Banjara Hills': (17.4138, 78.4398), 'Gachibowli': (17.4401, 78.3489), 'HITEC City': (17.4435, 78.3772),
+        'Kukatpally': (17.4849, 78.4138), 'Secunderabad': (17.4399, 78.4983)
+    },
+    'Pune': {
+        'Hadapsar': (18.5089, 73.9260), 'Hinjewadi': (18.5913, 73.7389), 'Kothrud': (18.5074, 73.8077),
+        'Viman Nagar': (18.5679, 73.9143)
+    },
+    'Ahmedabad': {
+        'Maninagar': (22.9962, 72.6008), 'Navrangpura': (23.0365, 72.5611), 'Satellite': (23.0300, 72.5176)
+    },
+    'Jaipur': {
+        'Malviya Nagar': (26.8549, 75.8243), 'Mansarovar': (26.8505, 75.7628), 'Vaishali Nagar': (26.9115, 75.7435)
+    },
+    'Lucknow': {
+        'Aliganj': (26.8920, 80.9420), 'Gomti Nagar': (26.8500, 81.0000), 'Hazratganj': (26.8506, 80.9470)
+    }
+}
+_locality_names = {city: sorted(((name.lower(), coords) for name, coords in localities.items()),
+                                key=lambda item: -len(item[0]))
+                   for city, localities in LOCALITY_COORDINATES.items()}
+
+def get_city_coordinates(city):
+    """Get approximate coordinates for Indian cities, or None for a city not in the table"""
+    return CITY_COORDINATES.get(city)
+
+def geocode(city, address=''):
+    """(lat, lon) for an address from the offline tables, or None for an unknown city
+
+    A known locality named in the address places it there; otherwise it sits
+    at its city centre.
+    """
+    text = (address or '').lower()
+    for name, coords in _locality_names.get(city, ()):
+        if name in text:
+            return coords
+    return CITY_COORDINATES.get(city)
+
+def row_location(row):
+    """(lat, lon) of a donor or request, falling back to its city centre; None if unknown"""
+    lat, lon = row.get('lat'), row.get('lon')
+    if lat in (None, '') or lon in (None, ''):
+        return CITY_COORDINATES.get(row.get('city'))
+    return float(lat), float(lon)
+
+# Donor locations are indexed on a uniform lat/lon grid. A cell is about
+# 28 km tall, so a radius search touches a few dozen cells at most.
+GRID_CELL_DEGREES = 0.25
+
+def grid_cell(location, cell_degrees=GRID_CELL_DEGREES):
+    """The (row, column) grid cell holding a (lat, lon) point"""
+    return floor(location[0] / cell_degrees), floor(location[1] / cell_degrees)
+
+def search_box(location, radius_km):
+    """(lat span, lon span) in degrees either side of location holding every point within radius_km
+
+    Latitude reaches the angular radius either way, longitude the widest
+    span the circle has. Padded so float rounding never leaves out a point
+    on the boundary.
+    """
+    lat = location[0]
+    angle = radius_km / EARTH_RADIUS_KM
+    lat_span = degrees(angle)
+    if angle >= pi / 2 or sin(angle) >= cos(radians(lat)):
+        lon_span = 180.0  # The circle reaches a pole
+    else:
+        lon_span = degrees(asin(sin(angle) / cos(radians(lat))))
+    return lat_span + 1e-9, lon_span + 1e-9
+
+def grid_ranges(location, radius_km, cell_degrees=GRID_CELL_DEGREES):
+    """(rows, columns) ranges of the grid cells that may hold a point within radius_km of location
+
+    Longitudes are not wrapped at the antimeridian.
+    """
+    lat, lon = location
+    lat_span, lon_span = search_box(location, radius_km)
+    rows = range(floor((lat - lat_span) / cell_degrees), floor((lat + lat_span) / cell_degrees) + 1)
+    columns = range(floor((lon - lon_span) / cell_degrees), floor((lon + lon_span) / cell_degrees) + 1)
+    return rows, columns
+
+def grid_cells_within(location, radius_km, cell_degrees=GRID_CELL_DEGREES):
+    """Every grid cell that may hold a point within radius_km of location"""
+    rows, columns = grid_ranges(location, radius_km, cell_degrees)
+    return [(row, column) for row in rows for column in columns]
+
+def _grid_keys(row, values):
+    """(available, value, grid cell) index keys of a donor, or none without a location"""
+    location = row_location(row)
+    if location is None:
+        return ()
+    cell = grid_cell(location)
+    available = row.get('available', True)
+    return [(available, value, cell) for value in values]
+
+# Widest search radius a request may ask for, the largest the request form
+# offers. The grid cells a search looks up grow with the square of it.
+MAX_SEARCH_DISTANCE_KM = 200
+
+def request_max_distance(request_data):
+    """How far from a request, in km, donors are looked for"""
+    default = 50 if request_data.get('type') == 'blood' else 100  # 50km for blood, 100km for organs
+    return min(MAX_SEARCH_DISTANCE_KM, request_data.get('max_distance') or default)
+
+# Reverse matching finds the active requests whose search radius reaches a
+# donor. Requests are indexed by the smallest band at least as wide as their
+# max distance, on a grid whose cells are one band wide, so a donor looks up
+# a few cells around it per band.
+REVERSE_MATCH_BANDS_KM = (25, 50, 100, MAX_SEARCH_DISTANCE_KM)
+KM_PER_DEGREE = EARTH_RADIUS_KM * pi / 180
+
+def _open_request_keys(row):
+    """(type, blood group or organ, band, cell) key an active request is found under by donors"""
+    needed = row.get('blood_group') if row.get('type') == 'blood' else row.get('organ')
+    location = row_location(row)
+    if row.get('status') != 'active' or not needed or location is None:
+        return ()
+    max_distance = request_max_distance(row)
+    band = next(band for band in REVERSE_MATCH_BANDS_KM if max_distance <= band)
+    return ((row['type'], needed, band, grid_cell(location, band / KM_PER_DEGREE)),)
+
+# Low-cardinality columns whose values are interned, so thousands of cached
+# rows share one string object per city, blood group, status and so on
+INTERNED_FIELDS = ('gender', 'city', 'blood_group', 'type', 'organ', 'urgency', 'status')
+
+# Parsed organ lists keyed by their CSV text. Donors pledging the same organs
+# share one list object and skip json.loads; the lists must not be mutated.
+_parsed_organs = {}
+MAX_PARSED_ORGANS = 4096
+
+def _parse_organs(value):
+    """Convert an organs CSV value back to a (shared) list"""
+    organs = _parsed_organs.get(value)
+    if organs is None:
+        if value:
+            organs = json.loads(value) if value.startswith('[') else value.split(',')
+            organs = [sys.intern(organ) for organ in organs]
+        else:
+            organs = []
+        if len(_parsed_organs) < MAX_PARSED_ORGANS:
+            _parsed_organs[value] = organs
+    return organs
+
+def _convert_row(file_type, row):
+    """Convert CSV string values back to their Python types"""
+    if file_type == 'donors' and 'organs' in row:
+        # Convert organs string back to list
+        row['organs'] = _parse_organs(row['organs'])
+
+    for field in INTERNED_FIELDS:
+        if row.get(field):
+            row[field] = sys.intern(row[field])
+
+    # Convert boolean fields
+    if 'available' in row:
+        row['available'] = row['available'].lower() == 'true'
+
+    # Convert numeric fields
+    if 'age' in row and row['age']:
+        row['age'] = int(row['age'])
+    if 'quantity' in row and row['quantity']:
+        row['quantity'] = int(row['quantity'])
+    if 'max_distance' in row and row['max_distance']:
+        row['max_distance'] = int(row['max_distance'])
+    if 'distance' in row and row['distance']:
+        row['distance'] = float(row['distance'])
+    for field in ('lat', 'lon'):
+        if field in row:
+            row[field] = float(row[field]) if row[field] not in (None, '') else None
+    # Rows stored before coordinates were recorded sit at their city centre
+    if 'lat' in row and 'city' in row and (row['lat'] is None or row.get('lon') is None):
+        row['lat'], row['lon'] = CITY_COORDINATES.get(row['city'], (None, None))
+    return row
+
+# Bytes remembered from just before the parsed offset, used to notice a file
+# that was rewritten in place rather than appended to
+TAIL_SIGNATURE_BYTES = 64
+
+# Secondary indexes maintained alongside cached tables. Each index maps a
+# key to the rows carrying it; the function returns the keys for one row.
+TABLE_INDEXES = {
+    'donors': {
+        'blood_group': lambda row: ((row.get('available', True), row['blood_group'], row['city']),),
+        'blood_group_cell': lambda row: _grid_keys(row, (row['blood_group'],)),
+        'organ_cell': lambda row: _grid_keys(row, row['organs'] if isinstance(row['organs'], list) else ())
+    },
+    'notifications': {
+        'donor_id': lambda row: (row['donor_id'],),
+        'request_id': lambda row: (row['request_id'],),
+        'donor_request': lambda row: ((row['donor_id'], row['request_id']),)
+    },
+    'active_requests': {
+        'listing': lambda row: ((row.get('status', ''), row.get('type', ''), row.get('urgency', ''), row['city']),),
+        'open_need': _open_request_keys
+    }
+}
+
+# Running totals kept alongside cached tables, so counts such as available
+# donors never need a pass over the table. Each function returns the
+# (stat, amount) pairs one row contributes; tuple stats hold one counter per
+# value, e.g. ('city', 'Pune') -> donors in Pune.
+TABLE_STATS = {
+    'donors': lambda row: (
+        ('available', 1 if row.get('available') is True else 0),
+        ('organ_pledges', len(row['organs']) if isinstance(row.get('organs'), list) else 0),
+        (('city', row.get('city', '')), 1)
+    ),
+    'active_requests': lambda row: (
+        (('status', row.get('status', '')), 1),
+        (('type', row.get('type', '')), 1),
+        (('urgency', row.get('urgency', '')), 1)
+    )
+}
+
+# The index answering filtered listings of a table, and the fields making
+# up its keys in order (see query_csv_data)
+LISTING_INDEXES = {
+    'donors': ('blood_group', ('available', 'blood_group', 'city')),
+    'active_requests': ('listing', ('status', 'type', 'urgency', 'city'))
+}
+
+def _index_row(file_type, entry, row, remove=False):
+    """Add a row to (or remove it from) every index and the running stats of a cached table"""
+    row_stats = TABLE_STATS.get(file_type)
+    if row_stats:
+        _add_row_stats(entry['stats'], row_stats(row), -1 if remove else 1)
+    for index_name, index_keys in TABLE_INDEXES.get(file_type, {}).items():
+        index = entry['indexes'][index_name]
+        for key in index_keys(row):
+            if remove:
+                bucket = index.get(key)
+                if bucket is not None:
+                    bucket.pop(row['id'], None)
+                    if not bucket:
+                        del index[key]
+            else:
+                index.setdefault(key, {})[row['id']] = row
+
+def _add_row_stats(stats, contributions, sign):
+    """Add (sign 1) or take away (sign -1) one row's contributions to a stats dict"""
+    for stat, amount in contributions:
+        if amount:
+            total = stats.get(stat, 0) + sign * amount
+            if total:
+                stats[stat] = total
+            else:
+                stats.pop(stat, None)
+
+def _writable_data(entry):
+    """A cache entry's rows dict, ready to change
+
+    Once _csv_read_table has handed the dict out, callers may still be
+    iterating it, so it is copied before the first change after that.
+    """
+    if entry.get('shared'):
+        entry['data'] = dict(entry['data'])
+        entry['shared'] = False
+    return entry['data']
+
+def _apply_update(file_type, entry, record_id, field, value):
+    """Apply one update log entry to a cached row and its indexes"""
+    row = entry['data'].get(record_id)
+    if row is None:
+        # The row itself has not been parsed yet; hold on to the change
+        entry['pending_updates'].setdefault(record_id, []).append((field, value))
+        return
+    # Rows are handed out to callers, so changes go into a copy
+    updated = dict(row)
+    updated[field] = _convert_row(file_type, {field: value})[field]
+    _index_row(file_type, entry, row, remove=True)
+    _writable_data(entry)[record_id] = updated
+    _index_row(file_type, entry, updated)
+    entry.pop('columns', None)
+
+def _parse_csv_rows(file_type, chunk, entry):
+    """Parse complete CSV lines from chunk into a cache entry and its indexes"""
+    data = _writable_data(entry) if chunk else entry['data']
+    reader = csv.DictReader(io.StringIO(chunk.decode('utf-8'), newline=''), fieldnames=entry.get('fieldnames'))
+    parsed = 0
+    for row in reader:
+        if row['id']:  # Skip empty rows
+            parsed += 1
+            row = _convert_row(file_type, row)
+            previous = data.get(row['id'])
+            if previous is not None:
+                _index_row(file_type, entry, previous, remove=True)
+                # Columnar copies are position-aligned and only ever extended
+                entry.pop('columns', None)
+            else:
+                entry['positions'][row['id']] = len(entry['positions'])
+            data[row['id']] = row
+            _index_row(file_type, entry, row)
+            for field, value in entry['pending_updates'].pop(row['id'], ()):
+                _apply_update(file_type, entry, row['id'], field, value)
+    entry['fieldnames'] = reader.fieldnames
+    if metrics and parsed:
+        metrics.inc('lifelink_storage_rows_parsed_total', parsed, table=file_type)
+
+def _parse_update_log(file_type, chunk, entry):
+    """Fold complete update log lines from chunk into a cache entry"""
+    reader = csv.DictReader(io.StringIO(chunk.decode('utf-8'), newline=''), fieldnames=UPDATE_LOG_FIELDS)
+    for update in reader:
+        if update['id'] and update['field']:
+            _apply_update(file_type, entry, update['id'], update['field'], update['value'] or '')
+
+def _read_appended(filepath, state):
+    """Read the bytes appended to a file since state was taken
+
+    Returns (chunk, new_state, incremental). chunk holds complete lines only.
+    incremental is False when the whole file had to be read from the start
+    because it was replaced, shrank or was rewritten in place. A missing
+    file reads as empty with a state of None.
+    """
+    try:
+        csvfile = open(filepath, 'rb')
+    except FileNotFoundError:
+        return b'', None, state is None
+
+    with csvfile:
+        if metrics:
+            metrics.inc('lifelink_storage_files_opened_total', file=os.path.basename(filepath))
+        stat = os.fstat(csvfile.fileno())
+        incremental = (
+            state is not None
+            and state['inode'] == stat.st_ino
+            and state['offset'] <= stat.st_size
+        )
+        if incremental:
+            if state['offset'] == stat.st_size and state['mtime'] == stat.st_mtime_ns:
+                return b'', state, True
+            start = max(state['offset'] - len(state['tail']), 0)
+            csvfile.seek(start)
+            chunk = csvfile.read()
+            head = chunk[:state['offset'] - start]
+            if head != state['tail'] or state['offset'] == stat.st_size:
+                # Same size but a newer mtime, or different leading
+                # bytes: the file was rewritten in place
+                incremental = False
+            else:
+                chunk = chunk[len(head):]
+        if not incremental:
+            csvfile.seek(0)
+            chunk = csvfile.read()
+
+    if metrics and chunk:
+        metrics.inc('lifelink_storage_bytes_read_total', len(chunk), file=os.path.basename(filepath))
+
+    # Leave a partially written last line for the next read
+    complete = chunk.rfind(b'\n') + 1
+    chunk = chunk[:complete]
+
+    offset = state['offset'] if incremental else 0
+    tail = state['tail'] if incremental else b''
+    return chunk, {
+        'offset': offset + complete,
+        'inode': stat.st_ino,
+        'mtime': stat.st_mtime_ns,
+        'tail': (tail + chunk)[-TAIL_SIGNATURE_BYTES:]
+    }, incremental
+
+def _load_table(file_type, filepath, cached):
+    """Bring a cached table up to date, parsing only rows appended since the last read
+
+    Both the table file and its update log are read incrementally. Returns
+    the updated cache entry, None if the table could not be opened, or an
+    entry flagged 'failed' holding whatever parsed before an error. A full
+    reparse happens when there is no usable cached copy or either file was
+    replaced, shrank or rewritten in place.
+    """
+    logpath = UPDATE_LOG_FILES[file_type]
+    try:
+        if cached is not None and cached['fieldnames']:
+            chunk, base_state, base_incremental = _read_appended(filepath, cached['base'])
+            log_chunk, log_state, log_incremental = _read_appended(logpath, cached['log'])
+            incremental = base_state is not None and base_incremental and log_incremental
+        else:
+            incremental = False
+        if not incremental:
+            chunk, base_state, _ = _read_appended(filepath, None)
+            log_chunk, log_state, _ = _read_appended(logpath, None)
+    except Exception as e:
+        print(f"Error reading {filepath}: {e}")
+        return None
+    if base_state is None:
+        return None
+
+    if metrics:
+        metrics.inc('lifelink_storage_cache_hits_total' if incremental else 'lifelink_storage_cache_misses_total',
+                    table=file_type)
+    if incremental:
+        entry = cached
+    else:
+        entry = {
+            'data': {},
+            'positions': {},  # row id -> order of first appearance in the file
+            'indexes': {name: {} for name in TABLE_INDEXES.get(file_type, {})},
+            'stats': {},  # running totals, see TABLE_STATS
+            'pending_updates': {}  # row id -> updates logged before the row was read
+        }
+    try:
+        _parse_csv_rows(file_type, chunk, entry)
+        _parse_update_log(file_type, log_chunk, entry)
+    except Exception as e:
+        print(f"Error reading {filepath}: {e}")
+        entry['failed'] = True
+        return entry
+
+    entry['base'] = base_state
+    entry['log'] = log_state
+    return entry
+
+def _invalidate_table(file_type):
+    """Drop the cached copy of a table after this process rewrites it"""
+    with _table_cache_lock:
+        _write_generation[file_type] += 1
+        _table_cache.pop(file_type, None)
+
+def _current_table_entry(file_type):
+    """Return the up-to-date cache entry for a table, or None if it has no file
+
+    The caller must hold _table_cache_lock (see _cached_table): tail parsing
+    mutates the cached entry's indexes in place, so readers take turns.
+    """
+    filepath = CSV_FILES[file_type]
+    if not os.path.exists(filepath):
+        return None
+
+    generation = _write_generation[file_type]
+    cached = _table_cache.get(file_type)
+    if cached is not None and cached['generation'] != generation:
+        cached = None
+    started = time.perf_counter() if metrics else None
+    entry = _load_table(file_type, filepath, cached)
+    if metrics:
+        metrics.observe('lifelink_storage_load_seconds', time.perf_counter() - started, table=file_type)
+    if entry is None or entry.get('failed'):
+        _table_cache.pop(file_type, None)
+        return entry
+    entry['generation'] = generation
+    _table_cache[file_type] = entry
+    return entry
+
+@contextmanager
+def _cached_table(file_type):
+    """Hold the locks needed to use a table's cache entry and yield it"""
+    with table_lock(file_type, exclusive=False), _table_cache_lock:
+        yield _current_table_entry(file_type)
+
+def _csv_read_table(file_type):
+    """Read data from CSV file and return as dictionary
+
+    Parsed tables are cached in memory. When a file has only grown since the
+    last read, just the appended rows are parsed; a full reparse happens only
+    after a rewrite. The returned dictionary is shared between callers: treat
+    it as read-only unless the changes are saved straight back with
+    write_csv_data. The cache copies it before changing it again.
+    """
+    with _cached_table(file_type) as entry:
+        if not entry:
+            return {}
+        entry['shared'] = True
+        return entry['data']
+
+def _csv_read_record(file_type, record_id):
+    """Return one row of a table by id, or None"""
+    with _cached_table(file_type) as entry:
+        return entry['data'].get(record_id) if entry else None
+
+def _csv_read_index(file_type, index_name, keys):
+    """Return the rows of a table matching any of the index keys, in file order"""
+    with _cached_table(file_type) as entry:
+        if not entry or entry.get('failed'):
+            # No trustworthy index, fall back to scanning whatever was parsed
+            index_keys = TABLE_INDEXES[file_type][index_name]
+            data = entry['data'] if entry else {}
+            return [row for row in data.values() if any(key in keys for key in index_keys(row))]
+
+        index = entry['indexes'][index_name]
+        rows = {}
+        for key in keys:
+            rows.update(index.get(key, {}))
+        positions = entry['positions']
+        return sorted(rows.values(), key=lambda row: positions[row['id']])
+
+def _csv_read_index_keys(file_type, index_name):
+    """Return the distinct keys currently present in a table index"""
+    with _cached_table(file_type) as entry:
+        if not entry or entry.get('failed'):
+            index_keys = TABLE_INDEXES[file_type][index_name]
+            data = entry['data'] if entry else {}
+            return list({key for row in data.values() for key in index_keys(row)})
+        return list(entry['indexes'][index_name])
+
+def _csv_query_table(file_type, filters, offset, limit):
+    """One page of the rows whose fields equal filters, and how many match (see query_csv_data)"""
+    end = None if limit is None else offset + limit
+    if not filters:
+        with _cached_table(file_type) as entry:
+            data = entry['data'] if entry else {}
+            # Past the last row is an empty page, however far past
+            count = len(data)
+            stop = count if end is None else min(end, count)
+            return list(islice(data.values(), min(offset, count), stop)), count
+
+    index_name, key_fields = LISTING_INDEXES[file_type]
+    positions = [(key_fields.index(field), value) for field, value in filters.items()]
+    keys = [key for key in _csv_read_index_keys(file_type, index_name)
+            if all(key[position] == value for position, value in positions)]
+    rows = _csv_read_index(file_type, index_name, keys) if keys else []
+    return rows[offset:end], len(rows)
+
+def _files_unchanged(file_type, entry):
+    """True if a table and its update log are exactly as entry last read them
+
+    Only stats the files, so it costs no opens or locks. A write in any
+    process moves the size, mtime or inode of one of them.
+    """
+    for path, state in ((CSV_FILES[file_type], entry['base']), (UPDATE_LOG_FILES[file_type], entry['log'])):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            if state is not None:
+                return False
+            continue
+        if (state is None or stat.st_ino != state['inode'] or stat.st_size != state['offset']
+                or stat.st_mtime_ns != state['mtime']):
+            return False
+    return True
+
+def _csv_table_stats(file_type):
+    """Row count and running totals of a table, kept up to date by the tail reader"""
+    # Polled counts are answered straight from the cache while the files
+    # are untouched; only a changed table takes the locks and reads the tail
+    with _table_cache_lock:
+        entry = _table_cache.get(file_type)
+        if (entry is not None and entry['generation'] == _write_generation[file_type]
+                and _files_unchanged(file_type, entry)):
+            return dict(entry['stats'], rows=len(entry['data']))
+    with _cached_table(file_type) as entry:
+        if not entry:
+            return {'rows': 0}
+        return dict(entry['stats'], rows=len(entry['data']))
+
+# Archive tables are only ever appended to, so their row counts are kept by
+# counting the rows appended since the last count: file type -> (file state,
+# rows). Their rows stay out of the cache unless someone reads them. A crash
+# mid-compaction may archive a row twice; the count includes it until the
+# archive itself is compacted.
+_archive_row_counts = {}
+
+def _csv_archive_rows(file_type):
+    """Number of rows in an archive table, counted from its tail without caching the rows"""
+    with table_lock(file_type, exclusive=False), _table_cache_lock:
+        state, count = _archive_row_counts.get(file_type, (None, 0))
+        chunk, new_state, incremental = _read_appended(CSV_FILES[file_type], state)
+        from_start = not incremental or state is None or state['offset'] == 0
+        if not incremental:
+            count = 0
+        rows = csv.reader(io.StringIO(chunk.decode('utf-8'), newline=''))
+        if from_start:
+            next(rows, None)  # Header
+        count += sum(1 for row in rows if row and row[0])
+        _archive_row_counts[file_type] = (new_state, count)
+        return count
+
+def _csv_count_rows(file_type, filters):
+    """Count a table's rows, or those whose one filter field has a value, from its running stats"""
+    if not filters and file_type in ARCHIVE_TABLES.values() and file_type not in _table_cache:
+        return _csv_archive_rows(file_type)
+    stats = _csv_table_stats(file_type)
+    if not filters:
+        return stats['rows']
+    if len(filters) > 1:
+        raise ValueError("CSV row counts take at most one filter")
+    (field, value), = filters.items()
+    return stats.get((field, value), 0)
+
+def _csv_write_table(file_type, data):
+    """Write data dictionary to CSV file
+
+    The new contents are swapped in atomically (see _replace_csv_file), so a
+    reader or a crash never sees a half-written table.
+    """
     filepath = CSV_FILES[file_type]
-    if os.path.exists(filepath):
+    with table_lock(file_type):
         try:
-            with open(filepath, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    if row['id']:  # Skip empty rows
-                        # Handle special data types
-                        if file_type == 'donors' and 'organs' in row:
-                            # Convert organs string back to list
-                            if row['organs']:
-                                row['organs'] = json.loads(row['organs']) if row['organs'].startswith('[') else row['organs'].split(',')
-                            else:
-                                row['organs'] = []
-
-                        # Convert boolean fields
-                        if 'available' in row:
-                            row['available'] = row['available'].lower() == 'true'
-
-                        # Convert numeric fields
-                        if 'age' in row and row['age']:
-                            row['age'] = int(row['age'])
-                        if 'quantity' in row and row['quantity']:
-                            row['quantity'] = int(row['quantity'])
-                        if 'max_distance' in row and row['max_distance']:
-                            row['max_distance'] = int(row['max_distance'])
-                        if 'distance' in row and row['distance']:
-                            row['distance'] = float(row['distance'])
-
-                        data[row['id']] = row
+            # The rows just written already include every logged update
+            _replace_csv_file(file_type, data.values())
         except Exception as e:
-            print(f"Error reading {filepath}: {e}")
-    return data
-
-def write_csv_data(file_type, data):
-    """Write data dictionary to CSV file"""
+            print(f"Error writing {filepath}: {e}")
+        finally:
+            _invalidate_table(file_type)
+
+def _clear_update_log(file_type):
+    """Empty a table's update log once its changes are in the table file"""
+    logpath = UPDATE_LOG_FILES[file_type]
+    if os.path.exists(logpath):
+        open(logpath, 'w').close()
+
+def _replace_csv_file(file_type, records):
+    """Atomically swap in a new version of a table file and empty its update log
+
+    The caller holds the writer lock, and the records must already include
+    every logged update. Rows go to a temporary file in the same directory,
+    which is fsynced while readers carry on with the old file. Readers are
+    held off only for the rename and the log truncation, so none sees the
+    new file with the old log. A crash leaves either version intact.
+    """
     filepath = CSV_FILES[file_type]
+    temppath = f"{filepath}.{os.getpid()}.tmp"
     try:
-        with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
+        with open(temppath, 'w', newline='', encoding='utf-8') as csvfile:
             writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDS[file_type])
             writer.writeheader()
-            for record in data.values():
-                # Handle special data types
-                record_copy = record.copy()
-                if 'organs' in record_copy and isinstance(record_copy['organs'], list):
-                    record_copy['organs'] = json.dumps(record_copy['organs'])
-
-                # Ensure all fields exist
-                for field in CSV_FIELDS[file_type]:
-                    if field not in record_copy:
-                        record_copy[field] = ''
-
-                writer.writerow(record_copy)
-    except Exception as e:
-        print(f"Error writing {filepath}: {e}")
+            written = 0
+            for record in records:
+                writer.writerow(_prepare_record(file_type, record))
+                written += 1
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+        with _readers_excluded(file_type):
+            os.replace(temppath, filepath)
+            _clear_update_log(file_type)
+        if metrics:
+            metrics.inc('lifelink_storage_rows_written_total', written, table=file_type)
+    finally:
+        if os.path.exists(temppath):
+            os.remove(temppath)
+
+def _prepare_record(file_type, record):
+    """Copy a record into the shape DictWriter expects for its table"""
+    # Handle special data types
+    record_copy = record.copy()
+    if 'organs' in record_copy and isinstance(record_copy['organs'], list):
+        record_copy['organs'] = json.dumps(record_copy['organs'])
+
+    # Ensure all fields exist
+    for field in CSV_FIELDS[file_type]:
+        if field not in record_copy:
+            record_copy[field] = ''
+    return record_copy
+
+def validate_record(file_type, record):
+    """Return a record as the strings stored for it
+
+    Raises ValueError if the record has fields its table does not, has no
+    id, or holds values read_csv_data could not convert back.
+    """
+    unknown = set(record) - set(CSV_FIELDS[file_type])
+    if unknown:
+        raise ValueError(f"unknown fields {sorted(unknown)}")
+    stored = {field: '' if value is None else str(value)
+              for field, value in _prepare_record(file_type, record).items()}
+    if not stored['id']:
+        raise ValueError("missing id")
+    try:
+        _convert_row(file_type, dict(stored))
+    except (ValueError, AttributeError) as e:
+        raise ValueError(f"record {stored['id']}: {e}") from None
+    return stored
 
-def add_csv_record(file_type, record):
-    """Add a single record to CSV file"""
+def _csv_add_records(file_type, records):
+    """Add several records to CSV file with one open and one writer
+
+    Returns False if the rows could not be written.
+    """
     filepath = CSV_FILES[file_type]
     try:
-        # Handle special data types
-        record_copy = record.copy()
-        if 'organs' in record_copy and isinstance(record_copy['organs'], list):
-            record_copy['organs'] = json.dumps(record_copy['organs'])
+        rows = [_prepare_record(file_type, record) for record in records]
+        if rows:
+            # Opened under the lock, so an append never lands in a file that
+            # a concurrent rewrite has just replaced
+            with table_lock(file_type), open(filepath, 'a', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDS[file_type])
+                writer.writerows(rows)
+            if metrics:
+                metrics.inc('lifelink_storage_rows_written_total', len(rows), table=file_type)
+    except Exception as e:
+        print(f"Error adding records to {filepath}: {e}")
+        return False
+    return True
+
+def _csv_update_record(file_type, record_id, changes):
+    """Change fields of one record by appending them to the table's update log
+
+    The write costs a few lines no matter how large the table is, and
+    read_csv_data folds the change into the row. A log grown past
+    UPDATE_LOG_COMPACT_BYTES is folded into the table later by a batch
+    job, never by the writer, which may hold other table locks. Returns
+    False if the change could not be written.
+    """
+    logpath = UPDATE_LOG_FILES[file_type]
+    with table_lock(file_type):
+        try:
+            with open(logpath, 'a', newline='', encoding='utf-8') as logfile:
+                writer = csv.writer(logfile)
+                for field, value in changes.items():
+                    if isinstance(value, list):
+                        value = json.dumps(value)
+                    writer.writerow([record_id, field, value])
+            log_size = os.path.getsize(logpath)
+            if metrics:
+                metrics.inc('lifelink_storage_updates_written_total', len(changes), table=file_type)
+        except Exception as e:
+            print(f"Error updating record in {logpath}: {e}")
+            return False
+
+    if log_size > UPDATE_LOG_COMPACT_BYTES:
+        _schedule_log_fold(file_type)
+    return True
+
+def compact_update_log(file_type):
+    """Fold a table's update log into the table file and empty the log"""
+    with table_lock(file_type):
+        _csv_write_table(file_type, _csv_read_table(file_type))
+
+# Tables with a log fold waiting on the scheduler, so each is queued once
+_log_folds_queued = set()
+_log_folds_lock = threading.Lock()
+
+def _schedule_log_fold(file_type):
+    """Queue a batch job folding a table's update log, unless one is waiting already"""
+    with _log_folds_lock:
+        if file_type in _log_folds_queued:
+            return
+        _log_folds_queued.add(file_type)
+    scheduler.submit('batch', _fold_update_log, file_type)
+
+def _fold_update_log(file_type):
+    """Fold a table's update log if it is still past UPDATE_LOG_COMPACT_BYTES (runs as a batch job)"""
+    with _log_folds_lock:
+        _log_folds_queued.discard(file_type)
+    logpath = UPDATE_LOG_FILES[file_type]
+    with table_lock(file_type):
+        # Another process may have folded it since
+        if os.path.exists(logpath) and os.path.getsize(logpath) > UPDATE_LOG_COMPACT_BYTES:
+            compact_update_log(file_type)
+
+# Closed requests older than this many days are moved to the archive
+# tables by compaction, along with their notifications
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_TABLES = {
+    'active_requests': 'archived_requests',
+    'notifications': 'archived_notifications'
+}
 
-        # Ensure all fields exist
-        for field in CSV_FIELDS[file_type]:
-            if field not in record_copy:
-                record_copy[field] = ''
+def _table_bytes(file_type):
+    """Size on disk of a table file plus its update log"""
+    return sum(os.path.getsize(path)
+               for path in (CSV_FILES[file_type], UPDATE_LOG_FILES[file_type])
+               if os.path.exists(path))
+
+def _csv_compact_table(file_type, archive=None, force=False):
+    """Rewrite one table with its update log and superseded rows folded in
+
+    Rows for which archive(row) is true are appended to the table's archive
+    first. Readers keep reading the old file while the new one is written and
+    wait only for the atomic swap; writers in every worker process wait on the
+    table's writer lock. Returns a report dict with the bytes reclaimed and
+    the time taken.
+    """
+    started = time.perf_counter()
+    with table_lock(file_type):
+        bytes_before = _table_bytes(file_type)
+        logpath = UPDATE_LOG_FILES[file_type]
+        has_log = os.path.exists(logpath) and os.path.getsize(logpath) > 0
+        # With nothing to fold or archive the table is not even read, so
+        # compacting the ever-growing archives does not pull them into memory
+        data = _csv_read_table(file_type) if archive or has_log or force else {}
+        archived = [row for row in data.values() if archive and archive(row)]
+
+        if archived or has_log or force:
+            if archived:
+                # Archive before dropping, so a crash can only duplicate rows
+                _csv_add_records(ARCHIVE_TABLES[file_type], archived)
+            archived_ids = {row['id'] for row in archived}
+            _replace_csv_file(file_type, [row for row in data.values() if row['id'] not in archived_ids])
+            _invalidate_table(file_type)
+        bytes_after = _table_bytes(file_type)
+
+    return {
+        'table': file_type,
+        'bytes_before': bytes_before,
+        'bytes_after': bytes_after,
+        'bytes_reclaimed': bytes_before - bytes_after,
+        'rows_archived': len(archived),
+        'seconds': time.perf_counter() - started
+    }
 
-        with open(filepath, 'a', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDS[file_type])
-            writer.writerow(record_copy)
-    except Exception as e:
-        print(f"Error adding record to {filepath}: {e}")
+class CSVStorage:
+    """Storage engine keeping each table in a CSV file under data/ (the default)"""
 
-def read_notifications_for_donor(donor_id):
-    """Read notifications for a specific donor from CSV"""
-    notifications = []
-    filepath = CSV_FILES['notifications']
-    if os.path.exists(filepath):
+    name = 'csv'
+
+    def read_table(self, file_type):
+        return _csv_read_table(file_type)
+
+    def read_record(self, file_type, record_id):
+        return _csv_read_record(file_type, record_id)
+
+    def read_index(self, file_type, index_name, keys):
+        return _csv_read_index(file_type, index_name, keys)
+
+    def read_index_keys(self, file_type, index_name):
+        return _csv_read_index_keys(file_type, index_name)
+
+    def query_table(self, file_type, filters, offset=0, limit=None):
+        return _csv_query_table(file_type, filters, offset, limit)
+
+    def table_stats(self, file_type):
+        return _csv_table_stats(file_type)
+
+    def count_rows(self, file_type, filters):
+        return _csv_count_rows(file_type, filters)
+
+    def write_table(self, file_type, data):
+        _csv_write_table(file_type, data)
+
+    def add_records(self, file_type, records):
+        return _csv_add_records(file_type, records)
+
+    def update_record(self, file_type, record_id, changes):
+        return _csv_update_record(file_type, record_id, changes)
+
+    def compact_table(self, file_type, archive=None, force=False):
+        return _csv_compact_table(file_type, archive, force)
+
+    def transaction(self, file_type):
+        """Context manager making a read-then-write on one table atomic"""
+        return table_lock(file_type)
+
+    def clear_cache(self):
+        """Forget cached tables so the next reads parse the files again"""
+        for file_type in CSV_FILES:
+            _invalidate_table(file_type)
+
+    def donor_columns(self, min_donors):
+        """Columnar copy of the donors table, or None below min_donors rows"""
+        if np is None:
+            return None
+        with _cached_table('donors') as entry:
+            if entry and not entry.get('failed') and len(entry['data']) >= min_donors:
+                return _donor_columns(entry)
+        return None
+
+# Rows of one grid cell, padded a little so float rounding in the
+# stored coordinates never drops a row (matches are re-checked anyway)
+GRID_CELL_SQL = ('CAST(lat AS REAL) >= ? AND CAST(lat AS REAL) < ? '
+                 'AND CAST(lon AS REAL) >= ? AND CAST(lon AS REAL) < ?')
+
+def _grid_cell_bounds(cell, cell_degrees=GRID_CELL_DEGREES):
+    """Padded (lat min, lat max, lon min, lon max) parameters for GRID_CELL_SQL"""
+    row, column = cell
+    return (row * cell_degrees - 1e-9, (row + 1) * cell_degrees + 1e-9,
+            column * cell_degrees - 1e-9, (column + 1) * cell_degrees + 1e-9)
+
+def _with_location(record):
+    """A record with empty coordinates filled in from its city centre"""
+    if record.get('lat') not in (None, '') and record.get('lon') not in (None, ''):
+        return record
+    lat, lon = CITY_COORDINATES.get(record.get('city'), (None, None))
+    return dict(record, lat=lat, lon=lon)
+
+class SQLiteStorage:
+    """Storage engine keeping every table in one SQLite database in WAL mode
+
+    Values are stored as the same strings the CSV files hold and converted
+    with _convert_row on the way out, so both engines return identical rows.
+    Rows keep their insertion order through SQLite's rowid, and a row added
+    again under an existing id is updated in place, as in the CSV tables.
+    """
+
+    name = 'sqlite'
+
+    INDEXES = {
+        'donors': [('blood_group', 'available', 'city'), ('available', 'blood_group', 'CAST(lat AS REAL)'),
+                   ('available', 'CAST(lat AS REAL)')],
+        'notifications': [('donor_id',), ('request_id',), ('donor_id', 'request_id')],
+        'active_requests': [('status',), ('status', 'type', 'urgency', 'city'), ('status', 'type', 'CAST(lat AS REAL)')]
+    }
+
+    # SQL answering each TABLE_INDEXES lookup, a function turning an index
+    # key into its parameters, and the columns the index key is built from.
+    # Matches are re-checked against the index key function, so the SQL may
+    # over-match (the organ LIKE and the padded grid cell bounds do).
+    INDEX_QUERIES = {
+        ('donors', 'blood_group'): ('available = ? AND blood_group = ? AND city = ?',
+                                    lambda key: (str(key[0]), key[1], key[2]),
+                                    ('available', 'blood_group', 'city')),
+        ('donors', 'blood_group_cell'): ('available = ? AND blood_group = ? AND ' + GRID_CELL_SQL,
+                                         lambda key: (str(key[0]), key[1]) + _grid_cell_bounds(key[2]),
+                                         ('available', 'blood_group', 'city', 'lat', 'lon')),
+        ('donors', 'organ_cell'): ('available = ? AND organs LIKE ? AND ' + GRID_CELL_SQL,
+                                   lambda key: (str(key[0]), f'%{key[1]}%') + _grid_cell_bounds(key[2]),
+                                   ('available', 'organs', 'city', 'lat', 'lon')),
+        ('notifications', 'donor_id'): ('donor_id = ?', lambda key: (key,), ('donor_id',)),
+        ('notifications', 'request_id'): ('request_id = ?', lambda key: (key,), ('request_id',)),
+        ('notifications', 'donor_request'): ('donor_id = ? AND request_id = ?', lambda key: key,
+                                             ('donor_id', 'request_id')),
+        ('active_requests', 'listing'): ('status = ? AND type = ? AND urgency = ? AND city = ?',
+                                         lambda key: key, ('status', 'type', 'urgency', 'city')),
+        ('active_requests', 'open_need'): (
+            "status = 'active' AND type = ? AND (blood_group = ? OR organ = ?) AND " + GRID_CELL_SQL,
+            lambda key: (key[0], key[1], key[1]) + _grid_cell_bounds(key[3], key[2] / KM_PER_DEGREE),
+            ('status', 'type', 'blood_group', 'organ', 'max_distance', 'city', 'lat', 'lon'))
+    }
+
+    # Index keys looked up per statement, keeping well inside SQLite's limit
+    # on bound parameters
+    KEYS_PER_QUERY = 200
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._connection = None
+        self._pid = None
+        self._generation = 0  # Bumped on every write made through this object
+        self._cache = {}  # file_type -> ((generation, data_version), data)
+        seed = not os.path.exists(path)
+        with self._lock:
+            self._connect()
+            if seed:
+                self._seed_from_csv()
+
+    def _connect(self):
+        """Return the connection for this process, creating the schema on first use"""
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+        # A connection must never cross a fork (gunicorn --preload)
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for file_type, fields in CSV_FIELDS.items():
+                columns = ', '.join(f'"{field}" TEXT' for field in fields if field != 'id')
+                connection.execute(f'CREATE TABLE IF NOT EXISTS "{file_type}" ("id" TEXT NOT NULL UNIQUE, {columns})')
+                self._add_missing_columns(connection, file_type)
+                for index_columns in self.INDEXES.get(file_type, []):
+                    connection.execute(
+                        f'CREATE INDEX IF NOT EXISTS "idx_{file_type}_{"_".join(index_columns)}" '
+                        f'ON "{file_type}" ({", ".join(index_columns)})')
+            self._create_table_stats(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        self._connection = connection
+        self._pid = os.getpid()
+        self._cache.clear()
+        return connection
+
+    def _add_missing_columns(self, connection, file_type):
+        """Add columns a table gained since the database was created
+
+        Rows from before coordinates were stored get their city centre, so
+        the grid lookups' range queries find them.
+        """
+        existing = {info[1] for info in connection.execute(f'PRAGMA table_info("{file_type}")')}
+        missing = [field for field in CSV_FIELDS[file_type] if field not in existing]
+        for field in missing:
+            connection.execute(f'ALTER TABLE "{file_type}" ADD COLUMN "{field}" TEXT DEFAULT \'\'')
+        if 'lat' in missing:
+            connection.executemany(f'UPDATE "{file_type}" SET lat = ?, lon = ? WHERE city = ?',
+                                   [(str(lat), str(lon), city) for city, (lat, lon) in CITY_COORDINATES.items()])
+
+    def _create_table_stats(self, connection):
+        """Create the table holding each table's running TABLE_STATS totals
+
+        Writes through this class adjust the totals in the same transaction,
+        so they hold for every process. A database from before the totals
+        existed is counted once here.
+        """
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'table_stats'").fetchone()
+        connection.execute('CREATE TABLE IF NOT EXISTS table_stats (file_type TEXT NOT NULL, stat TEXT NOT NULL, '
+                           'amount INTEGER NOT NULL, PRIMARY KEY (file_type, stat))')
+        if not exists:
+            for file_type in TABLE_STATS:
+                stats = {}
+                for values in connection.execute(f'SELECT {self._columns(file_type)} FROM "{file_type}"'):
+                    _add_row_stats(stats, self._row_stats(file_type, values), 1)
+                self._adjust_stats(connection, file_type, stats)
+
+    def _row_stats(self, file_type, values):
+        """TABLE_STATS contributions of a row, plus one to 'rows', from its stored values"""
+        row = _convert_row(file_type, dict(zip(CSV_FIELDS[file_type], values)))
+        return (('rows', 1),) + tuple(TABLE_STATS[file_type](row))
+
+    def _adjust_stats(self, connection, file_type, changes):
+        """Add a dict of stat -> amount to a table's running totals"""
+        connection.executemany(
+            'INSERT INTO table_stats VALUES (?, ?, ?) '
+            'ON CONFLICT (file_type, stat) DO UPDATE SET amount = amount + excluded.amount',
+            [(file_type, json.dumps(stat), amount) for stat, amount in changes.items() if amount])
+
+    def _stored_rows(self, connection, file_type, ids):
+        """Stored values of the rows with these ids, keyed by id"""
+        stored = {}
+        ids = list(ids)
+        for start in range(0, len(ids), self.KEYS_PER_QUERY):
+            batch = ids[start:start + self.KEYS_PER_QUERY]
+            for values in connection.execute(
+                    f'SELECT {self._columns(file_type)} FROM "{file_type}" '
+                    f'WHERE id IN ({", ".join("?" for _ in batch)})', batch):
+                stored[values[0]] = values
+        return stored
+
+    def _seed_from_csv(self):
+        """Copy existing CSV data into a freshly created database"""
+        for file_type in CSV_FIELDS:
+            rows = _csv_read_table(file_type)
+            if rows:
+                self.add_records(file_type, rows.values())
+
+    @contextmanager
+    def _writing(self):
+        """Run statements in one write transaction (joining an open one)"""
+        with self._lock:
+            connection = self._connect()
+            try:
+                if connection.in_transaction:
+                    yield connection
+                    return
+                connection.execute('BEGIN IMMEDIATE')
+                try:
+                    yield connection
+                except BaseException:
+                    connection.execute('ROLLBACK')
+                    raise
+                connection.execute('COMMIT')
+            finally:
+                self._generation += 1
+                self._cache.clear()
+
+    def _stored_value(self, field, value):
+        """The string a value is stored as, matching what the CSV writer produces"""
+        if field == 'available':
+            # Normalised so the availability index can be used for lookups
+            return str(value if isinstance(value, bool) else str(value).lower() == 'true')
+        if isinstance(value, list):
+            return json.dumps(value)
+        return '' if value is None else str(value)
+
+    def _columns(self, file_type):
+        """A table's CSV fields as a column list, id first"""
+        return ', '.join(f'"{field}"' for field in CSV_FIELDS[file_type])
+
+    def _select(self, file_type):
+        """SELECT statement for a table's rowid followed by its CSV fields"""
+        return f'SELECT rowid, {self._columns(file_type)} FROM "{file_type}"'
+
+    def read_table(self, file_type):
+        with self._lock:
+            connection = self._connect()
+            # data_version moves when another process commits to the database
+            version = (self._generation, connection.execute('PRAGMA data_version').fetchone()[0])
+            cached = self._cache.get(file_type)
+            if cached and cached[0] == version:
+                if metrics:
+                    metrics.inc('lifelink_storage_cache_hits_total', table=file_type)
+                return cached[1]
+            started = time.perf_counter() if metrics else None
+            fields = CSV_FIELDS[file_type]
+            try:
+                cursor = connection.execute(self._select(file_type) + ' ORDER BY rowid')
+                data = {values[1]: _convert_row(file_type, dict(zip(fields, values[1:])))
+                        for values in cursor}
+            except sqlite3.Error as e:
+                print(f"Error reading {file_type} from {self.path}: {e}")
+                return {}
+            if metrics:
+                metrics.inc('lifelink_storage_cache_misses_total', table=file_type)
+                metrics.inc('lifelink_storage_rows_parsed_total', len(data), table=file_type)
+                metrics.observe('lifelink_storage_load_seconds', time.perf_counter() - started, table=file_type)
+            self._cache[file_type] = (version, data)
+            return data
+
+    def read_record(self, file_type, record_id):
+        with self._lock:
+            try:
+                values = self._connect().execute(self._select(file_type) + ' WHERE id = ?', (record_id,)).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading {file_type} from {self.path}: {e}")
+                return None
+        return _convert_row(file_type, dict(zip(CSV_FIELDS[file_type], values[1:]))) if values else None
+
+    def read_index(self, file_type, index_name, keys):
+        where, params_for, _ = self.INDEX_QUERIES[(file_type, index_name)]
+        index_keys = TABLE_INDEXES[file_type][index_name]
+        wanted = set(keys)
+        found = {}
+        with self._lock:
+            try:
+                for start in range(0, len(keys), self.KEYS_PER_QUERY):
+                    batch = keys[start:start + self.KEYS_PER_QUERY]
+                    sql = self._select(file_type) + ' WHERE ' + ' OR '.join(f'({where})' for _ in batch)
+                    params = [param for key in batch for param in params_for(key)]
+                    for values in self._connect().execute(sql, params):
+                        found[values[0]] = dict(zip(CSV_FIELDS[file_type], values[1:]))
+            except sqlite3.Error as e:
+                print(f"Error reading {file_type} from {self.path}: {e}")
+                return []
+        if metrics:
+            metrics.inc('lifelink_storage_rows_parsed_total', len(found), table=file_type)
+        rows = (_convert_row(file_type, found[rowid]) for rowid in sorted(found))
+        return [row for row in rows if any(key in wanted for key in index_keys(row))]
+
+    def read_index_keys(self, file_type, index_name):
+        _, _, columns = self.INDEX_QUERIES[(file_type, index_name)]
+        index_keys = TABLE_INDEXES[file_type][index_name]
+        with self._lock:
+            try:
+                combinations = self._connect().execute(
+                    f'SELECT DISTINCT {", ".join(columns)} FROM "{file_type}"').fetchall()
+            except sqlite3.Error as e:
+                print(f"Error reading {file_type} from {self.path}: {e}")
+                return []
+        return list({key for values in combinations
+                     for key in index_keys(_convert_row(file_type, dict(zip(columns, values))))})
+
+    def query_table(self, file_type, filters, offset=0, limit=None):
+        """One page of the rows whose fields equal filters, and how many match, without loading the table"""
+        where = ' WHERE ' + ' AND '.join(f'"{field}" = ?' for field in filters) if filters else ''
+        params = [self._stored_value(field, value) for field, value in filters.items()]
+        with self._lock:
+            try:
+                connection = self._connect()
+                total = connection.execute(f'SELECT COUNT(*) FROM "{file_type}"' + where, params).fetchone()[0]
+                page = connection.execute(self._select(file_type) + where + ' ORDER BY rowid LIMIT ? OFFSET ?',
+                                          params + [-1 if limit is None else limit, offset]).fetchall()
+            except (sqlite3.Error, OverflowError) as e:
+                print(f"Error reading {file_type} from {self.path}: {e}")
+                return [], 0
+        if metrics:
+            metrics.inc('lifelink_storage_rows_parsed_total', len(page), table=file_type)
+        return [_convert_row(file_type, dict(zip(CSV_FIELDS[file_type], values[1:]))) for values in page], total
+
+    def table_stats(self, file_type):
+        """Row count and TABLE_STATS totals, read from the running totals writes keep"""
+        if file_type not in TABLE_STATS:
+            return {'rows': self.count_rows(file_type, {})}
+        with self._lock:
+            try:
+                totals = self._connect().execute(
+                    'SELECT stat, amount FROM table_stats WHERE file_type = ? AND amount != 0',
+                    (file_type,)).fetchall()
+            except sqlite3.Error as e:
+                print(f"Error counting {file_type} in {self.path}: {e}")
+                return {'rows': 0}
+        stats = {'rows': 0}
+        for stat, amount in totals:
+            stat = json.loads(stat)
+            stats[tuple(stat) if isinstance(stat, list) else stat] = amount
+        return stats
+
+    def count_rows(self, file_type, filters):
+        """Count rows in SQL, so polling counts never reloads a table after a write"""
+        sql = f'SELECT COUNT(*) FROM "{file_type}"'
+        if filters:
+            sql += ' WHERE ' + ' AND '.join(f'"{field}" = ?' for field in filters)
+        params = [self._stored_value(field, value) for field, value in filters.items()]
+        with self._lock:
+            try:
+                connection = self._connect()
+                cached = self._cache.get(file_type)
+                if not filters and cached and cached[0] == (
+                        self._generation, connection.execute('PRAGMA data_version').fetchone()[0]):
+                    return len(cached[1])
+                return connection.execute(sql, params).fetchone()[0]
+            except sqlite3.Error as e:
+                print(f"Error counting {file_type} in {self.path}: {e}")
+                return 0
+
+    def write_table(self, file_type, data):
+        try:
+            with self._writing() as connection:
+                connection.execute(f'DELETE FROM "{file_type}"')
+                connection.execute('DELETE FROM table_stats WHERE file_type = ?', (file_type,))
+                self._insert(connection, file_type, data.values())
+        except sqlite3.Error as e:
+            print(f"Error writing {file_type} to {self.path}: {e}")
+
+    def _insert(self, connection, file_type, records):
+        fields = CSV_FIELDS[file_type]
+        columns = ', '.join(f'"{field}"' for field in fields)
+        updates = ', '.join(f'"{field}" = excluded."{field}"' for field in fields if field != 'id')
+        if 'lat' in fields:
+            records = (_with_location(record) for record in records)
+        rows = [[self._stored_value(field, record.get(field, '')) for field in fields] for record in records]
+        if file_type in TABLE_STATS:
+            # Rows added again under an existing id replace the stored version
+            current = self._stored_rows(connection, file_type, {row[0] for row in rows})
+            stats = {}
+            for row in rows:
+                if row[0] in current:
+                    _add_row_stats(stats, self._row_stats(file_type, current[row[0]]), -1)
+                _add_row_stats(stats, self._row_stats(file_type, row), 1)
+                current[row[0]] = row
+            self._adjust_stats(connection, file_type, stats)
+        connection.executemany(
+            f'INSERT INTO "{file_type}" ({columns}) VALUES ({", ".join("?" for _ in fields)}) '
+            f'ON CONFLICT (id) DO UPDATE SET {updates}', rows)
+        if metrics:
+            metrics.inc('lifelink_storage_rows_written_total', len(rows), table=file_type)
+
+    def add_records(self, file_type, records):
+        try:
+            with self._writing() as connection:
+                self._insert(connection, file_type, records)
+        except sqlite3.Error as e:
+            print(f"Error adding records to {file_type} in {self.path}: {e}")
+            return False
+        return True
+
+    def update_record(self, file_type, record_id, changes):
+        assignments = ', '.join(f'"{field}" = ?' for field in changes)
+        params = [self._stored_value(field, value) for field, value in changes.items()]
+        try:
+            with self._writing() as connection:
+                if file_type in TABLE_STATS:
+                    old = self._stored_rows(connection, file_type, [record_id]).get(record_id)
+                    if old is not None:
+                        updated = dict(zip(CSV_FIELDS[file_type], old))
+                        updated.update(zip(changes, params))
+                        stats = {}
+                        _add_row_stats(stats, self._row_stats(file_type, old), -1)
+                        _add_row_stats(stats, self._row_stats(file_type, list(updated.values())), 1)
+                        self._adjust_stats(connection, file_type, stats)
+                connection.execute(f'UPDATE "{file_type}" SET {assignments} WHERE id = ?', params + [record_id])
+        except sqlite3.Error as e:
+            print(f"Error updating record in {file_type} in {self.path}: {e}")
+            return False
+        if metrics:
+            metrics.inc('lifelink_storage_updates_written_total', len(changes), table=file_type)
+        return True
+
+    def _database_bytes(self):
+        return sum(os.path.getsize(path) for path in (self.path, self.path + '-wal') if os.path.exists(path))
+
+    def compact_table(self, file_type, archive=None, force=False):
+        """Archive rows and checkpoint the WAL; superseded versions never pile up here"""
+        started = time.perf_counter()
+        bytes_before = self._database_bytes()
+        archived = []
+        try:
+            with self._writing() as connection:
+                archived = [row for row in self.read_table(file_type).values() if archive and archive(row)]
+                if archived:
+                    self._insert(connection, ARCHIVE_TABLES[file_type], archived)
+                    if file_type in TABLE_STATS:
+                        stats = {}
+                        for values in self._stored_rows(connection, file_type, [row['id'] for row in archived]).values():
+                            _add_row_stats(stats, self._row_stats(file_type, values), -1)
+                        self._adjust_stats(connection, file_type, stats)
+                    connection.executemany(f'DELETE FROM "{file_type}" WHERE id = ?',
+                                           [(row['id'],) for row in archived])
+            if archived or force:
+                with self._lock:
+                    self._connect().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        except sqlite3.Error as e:
+            print(f"Error compacting {file_type} in {self.path}: {e}")
+        bytes_after = self._database_bytes()
+        return {
+            'table': file_type,
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'bytes_reclaimed': bytes_before - bytes_after,
+            'rows_archived': len(archived),
+            'seconds': time.perf_counter() - started
+        }
+
+    @contextmanager
+    def transaction(self, file_type):
+        """Context manager making a read-then-write on one table atomic"""
+        with self._writing():
+            yield
+
+    def clear_cache(self):
+        """Forget cached tables so the next reads query the database again"""
+        with self._lock:
+            self._cache.clear()
+
+    def donor_columns(self, min_donors):
+        # Indexed SQL lookups stand in for the columnar engine
+        return None
+
+    def export_csv(self):
+        """Write every table out to its CSV file, e.g. for spreadsheets"""
+        for file_type in CSV_FIELDS:
+            with table_lock(file_type):
+                _replace_csv_file(file_type, self.read_table(file_type).values())
+                _invalidate_table(file_type)
+
+STORAGE_ENGINES = {
+    'csv': CSVStorage,
+    'sqlite': SQLiteStorage
+}
+
+def create_storage(config):
+    """Build the storage engine named by config['STORAGE_BACKEND']"""
+    backend = config.get('STORAGE_BACKEND', 'csv')
+    if backend == 'sqlite':
+        return SQLiteStorage(config.get('SQLITE_PATH', 'data/lifelink.db'))
+    if backend not in STORAGE_ENGINES:
+        raise ValueError(f"Unknown storage backend {backend!r}; expected one of {sorted(STORAGE_ENGINES)}")
+    return STORAGE_ENGINES[backend]()
+
+# The configured storage engine; set up once the CSV files exist
+storage = None
+
+def read_csv_data(file_type):
+    """Read a table from the configured storage and return it as a dictionary
+
+    The returned dictionary may be shared with other callers: treat it as
+    read-only unless the changes are saved straight back with write_csv_data.
+    """
+    return storage.read_table(file_type)
+
+def read_csv_record(file_type, record_id):
+    """Return one row of a table by id, or None if there is no such row"""
+    return storage.read_record(file_type, record_id)
+
+def read_csv_index(file_type, index_name, *keys):
+    """Return the rows of a table matching any of the index keys, in insertion order"""
+    return storage.read_index(file_type, index_name, list(keys))
+
+def read_csv_index_keys(file_type, index_name):
+    """Return the distinct keys currently present in a table index"""
+    return storage.read_index_keys(file_type, index_name)
+
+def query_csv_data(file_type, filters, offset=0, limit=None):
+    """Rows of a table whose fields equal the filter values, in insertion order
+
+    Only the requested page is read: the CSV backend answers filters from
+    the table's listing index (LISTING_INDEXES), SQLite with LIMIT/OFFSET.
+    Returns (rows from offset, up to limit of them, total number of matching rows).
+    """
+    return storage.query_table(file_type, filters, offset, limit)
+
+def read_table_stats(file_type):
+    """Row count ('rows') and running TABLE_STATS totals of a table"""
+    return storage.table_stats(file_type)
+
+def count_csv_rows(file_type, **filters):
+    """Number of rows in a table, optionally only those with a field equal to a value
+
+    Answered without parsing or scanning the table (see TABLE_STATS for the
+    fields the CSV backend can filter on), so it stays cheap for polling.
+    """
+    return storage.count_rows(file_type, filters)
+
+def donor_stats():
+    """Totals shown for the donor pool"""
+    stats = read_table_stats('donors')
+    return {
+        'total_donors': stats['rows'],
+        'available_donors': stats.get('available', 0),
+        'organ_pledges': stats.get('organ_pledges', 0),
+        'cities_covered': sum(1 for stat in stats if isinstance(stat, tuple) and stat[0] == 'city')
+    }
+
+def request_stats():
+    """Totals shown for donation requests, by status, type and urgency"""
+    stats = read_table_stats('active_requests')
+    return {
+        'total_requests': stats['rows'],
+        'active_requests': stats.get(('status', 'active'), 0),
+        'matched_requests': stats.get(('status', 'matched'), 0),
+        'blood_requests': stats.get(('type', 'blood'), 0),
+        'organ_requests': stats.get(('type', 'organ'), 0),
+        'critical_requests': stats.get(('urgency', 'critical'), 0),
+        'urgent_requests': stats.get(('urgency', 'urgent'), 0)
+    }
+
+def write_csv_data(file_type, data):
+    """Replace a whole table with the data dictionary"""
+    storage.write_table(file_type, data)
+
+def add_csv_record(file_type, record):
+    """Add a single record to a table"""
+    add_csv_records(file_type, [record])
+
+def add_csv_records(file_type, records):
+    """Add several records to a table in one write
+
+    Returns False if the rows could not be written.
+    """
+    return storage.add_records(file_type, records)
+
+def update_csv_record(file_type, record_id, changes):
+    """Change fields of one record without rewriting the table
+
+    Returns False if the change could not be written.
+    """
+    unknown = set(changes) - set(CSV_FIELDS[file_type])
+    if unknown:
+        print(f"Error updating record in {file_type}: unknown fields {sorted(unknown)}")
+        return False
+    return storage.update_record(file_type, record_id, changes)
+
+def compact_table(file_type, archive=None, force=False):
+    """Compact one table, moving rows for which archive(row) is true to its archive
+
+    Returns a report dict with the bytes reclaimed and the time taken.
+    """
+    return storage.compact_table(file_type, archive, force)
+
+def compact_all_tables(archive_after_days=ARCHIVE_AFTER_DAYS, force=False):
+    """Compact every table, archiving closed requests and their notifications"""
+    cutoff = (datetime.now() - timedelta(days=archive_after_days)).isoformat()
+    closed = {request_id for request_id, request_data in read_csv_data('active_requests').items()
+              if request_data.get('status') != 'active' and request_data.get('created_date', '') < cutoff}
+
+    reports = [compact_table('active_requests', archive=lambda row: row['id'] in closed, force=force)]
+    # Notifications of requests archived by earlier runs went with them
+    reports.append(compact_table('notifications',
+                                 archive=lambda row: row['request_id'] in closed,
+                                 force=force))
+    for file_type in CSV_FILES:
+        if file_type not in ('active_requests', 'notifications'):
+            reports.append(compact_table(file_type, force=force))
+    return reports
+
+# Background jobs run in one process however many workers start them: a
+# job's loop holds a flock on its lock file for as long as its process
+# lives, and the other processes try again each interval, so one of them
+# takes over if the holder exits.
+JOB_LOCK_FILES = {'compaction': 'data/compaction.lock', 'rematch': 'data/rematch.lock'}
+_job_locks = {}
+
+def _claim_job_lock(job):
+    """True if this process runs a background job, claiming it when no other process does"""
+    if job in _job_locks:
+        return True
+    if fcntl is not None:
+        lock_fd = os.open(JOB_LOCK_FILES[job], os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(lock_fd)
+            return False
+        _job_locks[job] = lock_fd
+    else:
+        _job_locks[job] = None
+    return True
+
+def _compaction_loop(interval):
+    """Compact all tables every interval seconds, in the process holding the compaction lock"""
+    while True:
+        time.sleep(interval)
+        if not _claim_job_lock('compaction'):
+            continue
         try:
-            with open(filepath, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    if row['donor_id'] == donor_id:
-                        if 'distance' in row and row['distance']:
-                            row['distance'] = float(row['distance'])
-                        notifications.append(row)
+            for report in compact_all_tables():
+                if report['bytes_reclaimed'] or report['rows_archived']:
+                    print(f"Compacted {report['table']}: {report['bytes_reclaimed']} bytes reclaimed, "
+                          f"{report['rows_archived']} rows archived in {report['seconds']:.3f}s")
         except Exception as e:
-            print(f"Error reading notifications: {e}")
-    return notifications
+            print(f"Error compacting tables: {e}")
+
+def start_compaction_thread(interval):
+    """Run table compaction in a background thread"""
+    thread = threading.Thread(target=_compaction_loop, args=(interval,), name='table-compaction', daemon=True)
+    thread.start()
+    return thread
+
+def read_notifications_for_donor(donor_id):
+    """Read notifications for a specific donor"""
+    return read_csv_index('notifications', 'donor_id', donor_id)
+
+def read_notifications_for_request(request_id):
+    """Read notifications sent out for a specific request"""
+    return read_csv_index('notifications', 'request_id', request_id)
+
+def find_notification(donor_id, request_id):
+    """Return the notification a donor was sent for a request, or None"""
+    notifications = read_csv_index('notifications', 'donor_request', (donor_id, request_id))
+    return notifications[-1] if notifications else None
+
+def accept_donation_request(donor_id, request_id, notification_id=None):
+    """Match a request to a donor if the request is still open
+
+    A compare-and-set: the donor's notification goes from pending to
+    accepted only while the request is still active, and the request is
+    marked matched in the same step. The three tables involved stay locked
+    (requests, then notifications, then matches) from the check to the last
+    write, so when several donors accept at once exactly one wins. Returns
+    the new match, or None if the request was no longer open or the
+    notification was not pending.
+    """
+    with storage.transaction('active_requests'), storage.transaction('notifications'), \
+            storage.transaction('accepted_matches'):
+        request_data = read_csv_record('active_requests', request_id)
+        if request_data is None or request_data.get('status') != 'active':
+            return None
+        if notification_id:
+            notification = read_csv_record('notifications', notification_id)
+        else:
+            notification = find_notification(donor_id, request_id)
+        if (notification is None or notification['donor_id'] != donor_id
+                or notification['request_id'] != request_id or notification['status'] != 'pending'):
+            return None
+
+        match_data = {
+            'id': str(uuid.uuid4()),
+            'donor_id': donor_id,
+            'request_id': request_id,
+            'matched_date': datetime.now().isoformat(),
+            'status': 'matched'
+        }
+        # The request is claimed first: if a later write fails it stays
+        # matched rather than open to a second, duplicate match
+        if not update_csv_record('active_requests', request_id, {'status': 'matched', 'matched_donor': donor_id}):
+            return None
+        update_csv_record('notifications', notification['id'], {'status': 'accepted'})
+        add_csv_records('accepted_matches', [match_data])
+    return match_data
+
+def warm_table_cache():
+    """Parse every table and build its indexes ahead of the first request
+
+    The archive tables only ever grow and are read just for the odd
+    archived request, so they are left to load on demand.
+    """
+    for file_type in CSV_FILES:
+        if file_type not in ARCHIVE_TABLES.values():
+            read_csv_data(file_type)
+
+# Storage engine: 'csv' (default) or 'sqlite'
+app.config['STORAGE_BACKEND'] = os.environ.get('LIFELINK_STORAGE', 'csv')
+app.config['SQLITE_PATH'] = os.environ.get('LIFELINK_SQLITE_PATH', 'data/lifelink.db')
+app.config['METRICS_ENABLED'] = os.environ.get('LIFELINK_METRICS', '') not in ('', '0')
+if app.config['METRICS_ENABLED']:
+    metrics = Metrics()
 
 # Initialize CSV files
 init_csv_files()
+storage = create_storage(app.config)
+warm_table_cache()
+
+# Background compaction is off unless an interval in seconds is configured;
+# compact_data.py runs the same compaction from the command line
+COMPACTION_INTERVAL = int(os.environ.get('LIFELINK_COMPACTION_INTERVAL', '0'))
+if COMPACTION_INTERVAL > 0 and multiprocessing.parent_process() is None:
+    start_compaction_thread(COMPACTION_INTERVAL)
 
 # Blood type compatibility mapping
 BLOOD_COMPATIBILITY = {
@@ -160,132 +1888,788 @@ BLOOD_COMPATIBILITY = {
 # Sample organs list
 ORGANS = ['Heart', 'Kidney', 'Liver', 'Lungs', 'Pancreas', 'Cornea', 'Bone Marrow', 'Skin']
 
-# Cities in India for location selection
-CITIES = [
-    'Mumbai', 'Delhi', 'Bangalore', 'Chennai', 'Kolkata', 'Hyderabad',
-    'Pune', 'Ahmedabad', 'Jaipur', 'Lucknow', 'Kanpur', 'Nagpur',
-    'Indore', 'Thane', 'Bhopal', 'Visakhapatnam', 'Pimpri', 'Patna'
-]
-
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two coordinates using Haversine formula"""
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    r = 6371  # Radius of earth in kilometers
-    return c * r
-
-def get_city_coordinates(city):
-    """Get approximate coordinates for Indian cities"""
-    coordinates = {
-        'Mumbai': (19.0760, 72.8777),
-        'Delhi': (28.7041, 77.1025),
-        'Bangalore': (12.9716, 77.5946),
-        'Chennai': (13.0827, 80.2707),
-        'Kolkata': (22.5726, 88.3639),
-        'Hyderabad': (17.3850, 78.4867),
-        'Pune': (18.5204, 73.8567),
-        'Ahmedabad': (23.0225, 72.5714),
-        'Jaipur': (26.9124, 75.7873),
-        'Lucknow': (26.8467, 80.9462),
-        'Kanpur': (26.4499, 80.3319),
-        'Nagpur': (21.1458, 79.0882),
-        'Indore': (22.7196, 75.8577),
-        'Thane': (19.2183, 72.9781),
-        'Bhopal': (23.2599, 77.4126),
-        'Visakhapatnam': (17.6868, 83.2185),
-        'Pimpri': (18.6298, 73.8131),
-        'Patna': (25.5941, 85.1376)
+# Bit encodings for compatibility checks: each blood group and organ gets
+# one bit, a recipient's acceptable donor groups collapse into one mask and
+# a donor's organ list into another, so a check is a single AND
+BLOOD_GROUP_BITS = {group: 1 << bit for bit, group in enumerate(BLOOD_COMPATIBILITY)}
+RECIPIENT_BLOOD_MASKS = {
+    recipient: sum(BLOOD_GROUP_BITS[group] for group in donor_groups)
+    for recipient, donor_groups in BLOOD_COMPATIBILITY.items()
+}
+ORGAN_BITS = {organ: 1 << bit for bit, organ in enumerate(ORGANS)}
+
+def compatible_blood_groups(recipient_blood):
+    """Donor blood groups whose bit is set in the recipient's mask"""
+    mask = RECIPIENT_BLOOD_MASKS.get(recipient_blood, 0)
+    return [group for group, bit in BLOOD_GROUP_BITS.items() if mask & bit]
+
+_organ_masks = {}
+
+def organ_mask(organs):
+    """Bitmask of the known organs in a donor's organ list"""
+    key = tuple(organs) if isinstance(organs, list) else ()
+    mask = _organ_masks.get(key)
+    if mask is None:
+        mask = 0
+        for organ in key:
+            mask |= ORGAN_BITS.get(organ, 0)
+        if len(_organ_masks) < MAX_PARSED_ORGANS:
+            _organ_masks[key] = mask
+    return mask
+
+# Donor pools at least this large are matched with the NumPy engine, when
+# NumPy is installed; below it the index lookups are already cheaper
+VECTORIZED_MATCH_MIN_DONORS = 5000
+
+# Top-K matching: donors notified per unit of blood requested, by urgency
+# (organ requests count as one unit), capped at TOP_K_MAX_DONORS. The grid
+# search starts at TOP_K_START_RADIUS_KM and doubles until the nearest K
+# donors are settled or max_distance is reached.
+TOP_K_DONORS_PER_UNIT = {'critical': 10, 'urgent': 5, 'moderate': 3}
+TOP_K_DEFAULT_PER_UNIT = 5
+TOP_K_MAX_DONORS = 100
+TOP_K_START_RADIUS_KM = 5
+
+def match_limit(request_data):
+    """How many of the nearest compatible donors a request notifies first"""
+    units = 1
+    if request_data.get('type') == 'blood':
+        try:
+            units = max(1, int(request_data.get('quantity') or 1))
+        except (TypeError, ValueError):
+            pass
+    per_unit = TOP_K_DONORS_PER_UNIT.get(request_data.get('urgency'), TOP_K_DEFAULT_PER_UNIT)
+    return min(TOP_K_MAX_DONORS, units * per_unit)
+
+# How long a pending notification counts towards a request's match_limit,
+# by urgency. A donor who has not answered by then no longer holds a place,
+# and re-matching notifies the next nearest donor instead.
+RESPONSE_WINDOW_HOURS = {'critical': 2, 'urgent': 12, 'moderate': 48}
+RESPONSE_WINDOW_DEFAULT_HOURS = 12
+
+def awaiting_response(request_data, notifications):
+    """How many of a request's notifications are pending and still inside its response window"""
+    hours = RESPONSE_WINDOW_HOURS.get(request_data.get('urgency'), RESPONSE_WINDOW_DEFAULT_HOURS)
+    cutoff = (datetime.now() - timedelta(hours=hours)).isoformat()
+    return sum(1 for notification in notifications
+               if notification['status'] == 'pending' and notification['timestamp'] >= cutoff)
+
+def _donor_columns(entry):
+    """Columnar NumPy arrays for a cached donors table entry
+
+    Arrays are aligned with the table's file order and extended with rows
+    appended since the last call; a fresh dict is published each time so a
+    matcher holding the previous one keeps a consistent snapshot. Donors are
+    coded by location, so donors sharing coordinates share one distance.
+    The caller must hold _table_cache_lock.
+    """
+    columns = entry.get('columns') or {
+        'rows': [],
+        'locations': [],
+        'location_lat': np.empty(0, dtype=np.float64),
+        'location_lon': np.empty(0, dtype=np.float64),
+        'blood_group': np.empty(0, dtype=np.uint8),
+        'location': np.empty(0, dtype=np.int32),
+        'organs': np.empty(0, dtype=np.int64),
+        'available': np.empty(0, dtype=bool)
     }
-    return coordinates.get(city, (28.7041, 77.1025))  # Default to Delhi
-
-def find_compatible_donors(recipient_request):
-    """Find donors compatible with recipient request"""
-    donors = read_csv_data('donors')
+    count = len(columns['rows'])
+    if count == len(entry['data']):
+        return columns
+
+    new_rows = list(islice(entry['data'].values(), count, None))
+    locations = list(columns['locations'])
+    location_codes = {location: code for code, location in enumerate(locations)}
+    codes = []
+    for row in new_rows:
+        location = row_location(row)
+        if location is None:
+            codes.append(-1)  # Never in range, see _find_compatible_donors_vectorized
+            continue
+        if location not in location_codes:
+            location_codes[location] = len(locations)
+            locations.append(location)
+        codes.append(location_codes[location])
+    added = locations[len(columns['locations']):]
+
+    columns = {
+        'rows': columns['rows'] + new_rows,
+        'locations': locations,
+        'location_lat': np.concatenate([columns['location_lat'], np.array(
+            [location[0] for location in added], dtype=np.float64)]),
+        'location_lon': np.concatenate([columns['location_lon'], np.array(
+            [location[1] for location in added], dtype=np.float64)]),
+        'blood_group': np.concatenate([columns['blood_group'], np.fromiter(
+            (BLOOD_GROUP_BITS.get(row['blood_group'], 0) for row in new_rows), dtype=np.uint8, count=len(new_rows))]),
+        'location': np.concatenate([columns['location'], np.array(codes, dtype=np.int32)]),
+        'organs': np.concatenate([columns['organs'], np.fromiter(
+            (organ_mask(row['organs']) for row in new_rows), dtype=np.int64, count=len(new_rows))]),
+        'available': np.concatenate([columns['available'], np.fromiter(
+            (row.get('available', True) is True for row in new_rows), dtype=bool, count=len(new_rows))])
+    }
+    entry['columns'] = columns
+    return columns
+
+# NumPy's trigonometry may differ from math's in the last bits, so distances
+# this close to the search radius or to a rounding boundary are recomputed
+# with calculate_distance before they decide anything
+DISTANCE_TOLERANCE_KM = 1e-6
+
+def _find_compatible_donors_vectorized(columns, request_type, mask, location, max_distance, limit=None):
+    """NumPy version of the matching loop, returning the same list as find_compatible_donors"""
+    donor_bits = columns['blood_group'] if request_type == 'blood' else columns['organs']
+    compatible = (donor_bits & mask) != 0
+
+    # Haversine, written out as in calculate_distance, over the distinct donor
+    # locations inside the search box
+    lat, lon = location
+    lat_span, lon_span = search_box(location, max_distance)
+    lats, lons = columns['location_lat'], columns['location_lon']
+    nearby = np.nonzero((np.abs(lats - lat) <= lat_span) & (np.abs(lons - lon) <= lon_span))[0]
+    near_lats, near_lons = np.radians(lats[nearby]), np.radians(lons[nearby])
+    a = (np.sin((radians(lat) - near_lats) / 2) ** 2
+         + np.cos(near_lats) * cos(radians(lat)) * np.sin((radians(lon) - near_lons) / 2) ** 2)
+    distances = 2 * np.arcsin(np.sqrt(a)) * EARTH_RADIUS_KM
+    scaled = distances * 100
+    doubtful = ((np.abs(distances - max_distance) <= DISTANCE_TOLERANCE_KM)
+                | (np.abs(scaled - np.floor(scaled) - 0.5) <= DISTANCE_TOLERANCE_KM * 100))
+    near_rounded = np.round(distances, 2)
+    near_in_range = distances <= max_distance
+    locations = columns['locations']
+    for position in np.nonzero(doubtful)[0].tolist():
+        location_lat, location_lon = locations[nearby[position]]
+        distance = calculate_distance(location_lat, location_lon, lat, lon)
+        near_in_range[position] = distance <= max_distance
+        near_rounded[position] = round(distance, 2)
+
+    # Per location code, with one extra slot for the code -1 of donors
+    # without a location
+    in_range = np.zeros(len(locations) + 1, dtype=bool)
+    in_range[nearby] = near_in_range
+    rounded = np.zeros(len(locations) + 1)
+    rounded[nearby] = near_rounded
+
+    code = columns['location']
+    selected = np.nonzero(columns['available'] & compatible & in_range[code])[0]
+    if limit is not None and len(selected) > limit:
+        # Keep the limit nearest without sorting the rest: everything closer
+        # than the limit-th distance, then ties at it in file order
+        keys = rounded[code[selected]]
+        kth = np.partition(keys, limit - 1)[limit - 1]
+        nearer = np.nonzero(keys < kth)[0]
+        ties = np.nonzero(keys == kth)[0][:limit - len(nearer)]
+        selected = selected[np.sort(np.concatenate([nearer, ties]))]
+    # A stable sort keeps file order between donors at the same distance
+    order = selected[np.argsort(rounded[code[selected]], kind='stable')]
+
+    rows = columns['rows']
+    return [{
+        'donor_id': rows[i]['id'],
+        'donor': rows[i],
+        'distance': distance
+    } for i, distance in zip(order.tolist(), rounded[code[order]].tolist())]
+
+def find_compatible_donors(recipient_request, limit=None):
+    """Find donors compatible with recipient request, nearest first
+
+    With a limit only the nearest limit donors are returned (the start of
+    the full list), and the search stops widening once they are known.
+    """
     compatible_donors = []
     request_type = recipient_request['type']
 
-    for donor_id, donor in donors.items():
-        if not donor.get('available', True):
-            continue
-
-        # Check if donor can provide what's needed
-        if request_type == 'blood' and 'blood_group' in donor:
-            # Check blood compatibility
-            recipient_blood = recipient_request['blood_group']
-            if donor['blood_group'] in BLOOD_COMPATIBILITY.get(recipient_blood, []):
-                # Calculate distance
-                donor_coords = get_city_coordinates(donor['city'])
-                recipient_coords = get_city_coordinates(recipient_request['city'])
-                distance = calculate_distance(donor_coords[0], donor_coords[1],
-                                           recipient_coords[0], recipient_coords[1])
-
-                if distance <= recipient_request.get('max_distance', 50):  # 50km default
-                    compatible_donors.append({
-                        'donor_id': donor_id,
-                        'donor': donor,
-                        'distance': round(distance, 2)
-                    })
-
-        elif request_type == 'organ' and 'organs' in donor:
-            # Check organ availability
-            required_organ = recipient_request['organ']
-            donor_organs = donor['organs'] if isinstance(donor['organs'], list) else []
-            if required_organ in donor_organs:
-                # Calculate distance
-                donor_coords = get_city_coordinates(donor['city'])
-                recipient_coords = get_city_coordinates(recipient_request['city'])
-                distance = calculate_distance(donor_coords[0], donor_coords[1],
-                                           recipient_coords[0], recipient_coords[1])
-
-                if distance <= recipient_request.get('max_distance', 100):  # 100km for organs
-                    compatible_donors.append({
-                        'donor_id': donor_id,
-                        'donor': donor,
-                        'distance': round(distance, 2)
-                    })
-
-    # Sort by distance
-    compatible_donors.sort(key=lambda x: x['distance'])
+    # Only available donors who can provide what's needed are looked at
+    if request_type == 'blood':
+        index_name = 'blood_group_cell'
+        wanted = compatible_blood_groups(recipient_request['blood_group'])
+        mask = RECIPIENT_BLOOD_MASKS.get(recipient_request['blood_group'], 0)
+    elif request_type == 'organ':
+        index_name = 'organ_cell'
+        wanted = [recipient_request['organ']]
+        mask = ORGAN_BITS.get(recipient_request['organ'])
+    else:
+        return compatible_donors
+    max_distance = request_max_distance(recipient_request)
+    location = row_location(recipient_request)
+    if location is None:
+        return compatible_donors
+
+    # Large pools go through the columnar engine when NumPy is available;
+    # organs outside ORGANS have no bit and stay on the index path
+    if np is not None and mask is not None:
+        columns = storage.donor_columns(VECTORIZED_MATCH_MIN_DONORS)
+        if columns is not None:
+            compatible_donors = _find_compatible_donors_vectorized(
+                columns, request_type, mask, location, max_distance, limit)
+            if metrics:
+                metrics.inc('lifelink_match_candidates_scanned_total', len(columns['rows']), engine='vectorized')
+                metrics.inc('lifelink_match_donors_found_total', len(compatible_donors), engine='vectorized')
+            return compatible_donors
+
+    # A limited search widens ring by ring, doubling its radius each time
+    radii = []
+    if limit is not None:
+        radius = TOP_K_START_RADIUS_KM
+        while radius < max_distance:
+            radii.append(radius)
+            radius *= 2
+    radii.append(max_distance)
+
+    # Only the grid cells the search circle overlaps are looked up. When
+    # there are more of those than donors, most are empty, so the keys the
+    # index actually holds are filtered instead.
+    rows, columns = grid_ranges(location, max_distance)
+    populated = None
+    if len(rows) * len(columns) * len(wanted) > count_csv_rows('donors'):
+        populated = [key for key in read_csv_index_keys('donors', index_name)
+                     if key[0] is True and key[1] in wanted]
+
+    scanned = 0
+    for radius in radii:
+        rows, columns = grid_ranges(location, radius)
+        if populated is None:
+            keys = [(True, value, (row, column)) for value in wanted for row in rows for column in columns]
+        else:
+            keys = [key for key in populated if key[2][0] in rows and key[2][1] in columns]
+        # Each candidate is then checked against its true distance
+        candidates = read_csv_index('donors', index_name, *keys)
+        scanned += len(candidates)
+        compatible_donors = []
+        for donor in candidates:
+            donor_location = row_location(donor)
+            distance = calculate_distance(donor_location[0], donor_location[1], location[0], location[1])
+            if distance <= max_distance:
+                compatible_donors.append({
+                    'donor_id': donor['id'],
+                    'donor': donor,
+                    'distance': round(distance, 2)
+                })
+
+        # Sort by distance
+        compatible_donors.sort(key=lambda x: x['distance'])
+        if limit is not None:
+            # Every donor not fetched yet is farther away than radius, so
+            # the nearest limit are settled once all are closer than it
+            if len(compatible_donors) >= limit and compatible_donors[limit - 1]['distance'] < round(radius, 2):
+                break
+    if limit is not None:
+        compatible_donors = compatible_donors[:limit]
+    if metrics:
+        metrics.inc('lifelink_match_candidates_scanned_total', scanned, engine='index')
+        metrics.inc('lifelink_match_donors_found_total', len(compatible_donors), engine='index')
     return compatible_donors
 
-def send_notifications_to_donors(request_id, compatible_donors):
-    """Send notifications to compatible donors"""
-    active_requests = read_csv_data('active_requests')
+# Donor blood group -> recipient blood groups it can give to
+DONOR_RECIPIENT_GROUPS = {
+    donor: [recipient for recipient, donor_groups in BLOOD_COMPATIBILITY.items() if donor in donor_groups]
+    for donor in BLOOD_COMPATIBILITY
+}
 
-    for donor_info in compatible_donors:
-        donor_id = donor_info['donor_id']
+def find_matching_requests(donor):
+    """Active requests a donor can serve, nearest first, as (request, distance) pairs
+
+    The reverse of find_compatible_donors: compatible requests whose own
+    max distance reaches the donor, found through the open_need index.
+    """
+    location = row_location(donor)
+    if donor.get('available', True) is not True or location is None:
+        return []
+    needs = [('blood', group) for group in DONOR_RECIPIENT_GROUPS.get(donor.get('blood_group'), ())]
+    needs += [('organ', organ) for organ in (donor.get('organs') or [])]
+    keys = []
+    for band in REVERSE_MATCH_BANDS_KM:
+        cells = grid_cells_within(location, band, band / KM_PER_DEGREE)
+        keys += [(request_type, needed, band, cell) for request_type, needed in needs for cell in cells]
+
+    matches = []
+    for request_data in read_csv_index('active_requests', 'open_need', *keys):
+        request_location = row_location(request_data)
+        distance = calculate_distance(location[0], location[1], request_location[0], request_location[1])
+        if distance <= request_max_distance(request_data):
+            matches.append((request_data, round(distance, 2)))
+    matches.sort(key=lambda match: match[1])
+    return matches
+
+def _notification_rows(request_data, compatible_donors, timestamp):
+    message = f"Urgent request for {request_data['type']} donation"
+    return [{
+        'id': str(uuid.uuid4()),
+        'donor_id': donor_info['donor_id'],
+        'request_id': request_data['id'],
+        'message': message,
+        'distance': donor_info['distance'],
+        'timestamp': timestamp,
+        'status': 'pending'
+    } for donor_info in compatible_donors]
+
+def send_notifications_to_donors(request_data, compatible_donors):
+    """Send notifications to compatible donors"""
+    notifications = _notification_rows(request_data, compatible_donors, datetime.now().isoformat())
+    return add_csv_records('notifications', notifications)
+
+def _add_new_notifications(matches):
+    """Notify the donors of (request, compatible donors) pairs who were not notified yet
+
+    Delivery is at-least-once: a fan-out replayed after a crash may have
+    been partly written, and re-matching meets donors notified before, so
+    (donor_id, request_id) pairs that already have a notification are left
+    alone. The check and one append for the whole batch happen in one
+    storage transaction on the notifications table. Returns how many were
+    written, or None if the append failed.
+    """
+    timestamp = datetime.now().isoformat()
+    with storage.transaction('notifications'):
+        notifications = []
+        for request_data, compatible_donors in matches:
+            notified = {notification['donor_id']
+                        for notification in read_notifications_for_request(request_data['id'])}
+            notifications += _notification_rows(
+                request_data, [donor_info for donor_info in compatible_donors
+                               if donor_info['donor_id'] not in notified], timestamp)
+        if notifications and not add_csv_records('notifications', notifications):
+            return None
+    return len(notifications)
+
+def notify_new_matches(matches, source):
+    """Notify the donors of (request, compatible donors) pairs who were not notified yet
+
+    Returns how many were sent.
+    """
+    if not matches:
+        return 0
+    sent = _add_new_notifications(matches)
+    if not sent:
+        return 0
+    if metrics:
+        metrics.inc('lifelink_rematch_notifications_total', sent, source=source)
+    return sent
+
+def rematch_donor(donor):
+    """Notify a newly registered donor of the active requests still short of donors
+
+    A request counts as short while fewer of its donors can still answer
+    (see awaiting_response) than match_limit asks for. Returns how many
+    requests the donor was told about.
+    """
+    matches = []
+    for request_data, distance in find_matching_requests(donor):
+        notifications = read_notifications_for_request(request_data['id'])
+        if awaiting_response(request_data, notifications) < match_limit(request_data):
+            matches.append((request_data, [{'donor_id': donor['id'], 'distance': distance}]))
+    return notify_new_matches(matches, source='registration')
+
+# Matching and notification work runs on scheduler threads fed by one FIFO
+# queue per priority. A request is scheduled at its urgency and batch
+# re-matching below all of them. Workers always take the most urgent job
+# waiting, and each is reserved for jobs at or above its own level, so
+# moderate and batch work can never take the threads critical requests need.
+SCHEDULER_PRIORITIES = ('critical', 'urgent', 'moderate', 'batch')
+
+# Worker threads per level, overridden by LIFELINK_SCHEDULER_WORKERS, e.g.
+# "critical=2,urgent=1,moderate=1,batch=1". Batch jobs only run on batch
+# workers, so there is always at least one.
+SCHEDULER_WORKERS = {'critical': 2, 'urgent': 1, 'moderate': 1, 'batch': 1}
+
+# Jobs each priority queue holds; a job beyond that runs in the caller
+SCHEDULER_QUEUE_SIZE = 1000
+
+# How long a form submission waits for its matching job before answering
+MATCH_WAIT_SECONDS = 2.0
+
+class PriorityScheduler:
+    """Worker threads fed by one FIFO queue per priority, most urgent first"""
+
+    def __init__(self, workers, queue_size=SCHEDULER_QUEUE_SIZE):
+        self.workers = dict(workers)
+        self.queue_size = queue_size
+        self._queues = {priority: deque() for priority in SCHEDULER_PRIORITIES}
+        self._condition = threading.Condition()
+        self._unfinished = 0
+        self._pid = None
+
+    def submit(self, priority, func, *args):
+        """Queue func(*args) at priority and return a Future for its result
+
+        When that priority's queue is full the job runs in the calling thread
+        instead, so a spike slows its callers down rather than losing work.
+        """
+        future = Future()
+        with self._condition:
+            self._start_workers()
+            jobs = self._queues[priority]
+            queued = len(jobs) < self.queue_size
+            if queued:
+                jobs.append((time.perf_counter(), future, func, args))
+                self._unfinished += 1
+                depth = len(jobs)
+                # Wake every worker: only some may take this priority
+                self._condition.notify_all()
+
+        if queued:
+            if metrics:
+                metrics.set('lifelink_scheduler_queue_depth', depth, priority=priority)
+        else:
+            if metrics:
+                metrics.inc('lifelink_scheduler_inline_jobs_total', priority=priority)
+            self._run(priority, future, func, args)
+        return future
+
+    def join(self):
+        """Block until every queued job, and any job those queued, has finished"""
+        with self._condition:
+            while self._unfinished:
+                self._condition.wait()
+
+    def _start_workers(self):
+        # Threads do not survive a fork, so each process starts its own
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        for level in SCHEDULER_PRIORITIES:
+            for number in range(self.workers.get(level, 0)):
+                threading.Thread(target=self._worker_loop, args=(level,),
+                                 name=f'scheduler-{level}-{number}', daemon=True).start()
+
+    def _worker_loop(self, level):
+        """Run the most urgent job this worker may take, forever"""
+        allowed = SCHEDULER_PRIORITIES[:SCHEDULER_PRIORITIES.index(level) + 1]
+        while True:
+            with self._condition:
+                priority = None
+                while priority is None:
+                    priority = next((p for p in allowed if self._queues[p]), None)
+                    if priority is None:
+                        self._condition.wait()
+                queued_at, future, func, args = self._queues[priority].popleft()
+                depth = len(self._queues[priority])
+            if metrics:
+                metrics.set('lifelink_scheduler_queue_depth', depth, priority=priority)
+                metrics.observe('lifelink_scheduler_wait_seconds', time.perf_counter() - queued_at,
+                                priority=priority)
+            try:
+                self._run(priority, future, func, args)
+            finally:
+                with self._condition:
+                    self._unfinished -= 1
+                    if not self._unfinished:
+                        self._condition.notify_all()
+
+    def _run(self, priority, future, func, args):
+        if not future.set_running_or_notify_cancel():
+            return
+        started = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception as e:
+            print(f"Error running {priority} job {func.__name__}: {e}")
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        if metrics:
+            metrics.observe('lifelink_scheduler_job_seconds', time.perf_counter() - started,
+                            priority=priority, job=func.__name__)
+
+def scheduler_worker_counts(setting):
+    """Worker threads per level from a "critical=2,batch=1" setting, over SCHEDULER_WORKERS"""
+    counts = dict(SCHEDULER_WORKERS)
+    for part in filter(None, (part.strip() for part in setting.split(','))):
+        level, _, count = part.partition('=')
+        try:
+            if level.strip() not in counts or int(count) < 0:
+                raise ValueError(part)
+            counts[level.strip()] = int(count)
+        except ValueError:
+            print(f"Error in LIFELINK_SCHEDULER_WORKERS: ignoring {part!r}")
+    if counts['batch'] < 1:
+        print("Error in LIFELINK_SCHEDULER_WORKERS: batch needs a worker, using 1")
+        counts['batch'] = 1
+    return counts
+
+def request_priority(request_data):
+    """Scheduler priority for a request's matching and notifications: its urgency"""
+    urgency = request_data.get('urgency')
+    return urgency if urgency in SCHEDULER_PRIORITIES[:-1] else 'moderate'
+
+scheduler = PriorityScheduler(scheduler_worker_counts(os.environ.get('LIFELINK_SCHEDULER_WORKERS', '')))
+
+# Notification fan-out runs as a scheduler job at the request's priority.
+# Every queued fan-out is first journalled so one that was still pending
+# when the process stopped is replayed on the next start. Each worker
+# process keeps its own journal, locked for as long as the process lives.
+FANOUT_JOURNAL_DIR = 'data/fanout_journal'
+
+_fanout_lock = threading.Lock()
+_pending_fanouts = set()
+_journal = {'pid': None, 'file': None}
+
+def _open_fanout_journal():
+    """Return this process's journal file, opened and locked on first use"""
+    if _journal['pid'] == os.getpid():
+        return _journal['file']
+    os.makedirs(FANOUT_JOURNAL_DIR, exist_ok=True)
+    path = os.path.join(FANOUT_JOURNAL_DIR, f"{os.getpid()}.jsonl")
+    while True:
+        journal = open(path, 'a', encoding='utf-8')
+        if fcntl is None:
+            break
+        fcntl.flock(journal.fileno(), fcntl.LOCK_EX)
+        # A replaying process may have removed the file before we locked it
+        try:
+            if os.stat(path).st_ino == os.fstat(journal.fileno()).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        journal.close()
+    _journal.update(pid=os.getpid(), file=journal)
+    return journal
+
+def _journal_fanout(event):
+    """Append one event line to this process's fan-out journal"""
+    journal = _open_fanout_journal()
+    journal.write(json.dumps(event) + '\n')
+    journal.flush()
+
+def _deliver_notifications(request_data, compatible_donors):
+    """Write notifications for one fan-out, skipping donors already notified (see _add_new_notifications)"""
+    if _add_new_notifications([(request_data, compatible_donors)]) is None:
+        return False
+
+    with _fanout_lock:
+        _pending_fanouts.discard(request_data['id'])
+        if _pending_fanouts:
+            _journal_fanout({'event': 'done', 'request_id': request_data['id']})
+        else:
+            # Nothing left in flight, so the journal can start over
+            _open_fanout_journal().truncate(0)
+    return True
+
+def queue_notifications(request_data, compatible_donors):
+    """Hand a request's notification fan-out to the scheduler at the request's priority"""
+    request_summary = {'id': request_data['id'], 'type': request_data['type']}
+    donors = [{'donor_id': donor_info['donor_id'], 'distance': donor_info['distance']}
+              for donor_info in compatible_donors]
+
+    with _fanout_lock:
+        _journal_fanout({'event': 'queued', 'request': request_summary, 'donors': donors})
+        _pending_fanouts.add(request_summary['id'])
+    return scheduler.submit(request_priority(request_data), _deliver_notifications, request_summary, donors)
+
+def match_and_notify(request_data):
+    """Find a new request's nearest compatible donors and queue their notifications"""
+    compatible_donors = find_compatible_donors(request_data, limit=match_limit(request_data))
+    if compatible_donors:
+        queue_notifications(request_data, compatible_donors)
+    return compatible_donors
 
-        notification = {
-            'id': str(uuid.uuid4()),
-            'donor_id': donor_id,
-            'request_id': request_id,
-            'message': f"Urgent request for {active_requests[request_id]['type']} donation",
-            'distance': donor_info['distance'],
-            'timestamp': datetime.now().isoformat(),
-            'status': 'pending'
-        }
+def drain_notification_queue():
+    """Block until every scheduled matching and notification job has finished"""
+    scheduler.join()
 
-        add_csv_record('notifications', notification)
+def _pending_journal_events(journal):
+    """Queued fan-out events in a journal that have no matching done event"""
+    pending = {}
+    for line in journal:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue  # Torn last line from a crash mid-write
+        if event['event'] == 'queued':
+            pending[event['request']['id']] = event
+        else:
+            pending.pop(event['request_id'], None)
+    return list(pending.values())
+
+def replay_pending_notifications():
+    """Deliver fan-outs journalled by processes that stopped before finishing
+
+    Journals still locked by a running worker process are left alone; any
+    other journal is replayed and removed.
+    """
+    if not os.path.isdir(FANOUT_JOURNAL_DIR):
+        return
+    for name in sorted(os.listdir(FANOUT_JOURNAL_DIR)):
+        path = os.path.join(FANOUT_JOURNAL_DIR, name)
+        if name == f"{os.getpid()}.jsonl":
+            if _journal['pid'] == os.getpid():
+                continue  # Our own live journal
+            # Left behind by an earlier process that had our pid
+            stale_path = f"{path}.{int(time.time())}.stale"
+            os.replace(path, stale_path)
+            path = stale_path
+        try:
+            journal = open(path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            continue  # Another worker replayed it first
+        with journal:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # Owner is still running
+                if not os.path.exists(path):
+                    continue
+            for event in _pending_journal_events(journal):
+                with _fanout_lock:
+                    _journal_fanout(event)
+                    _pending_fanouts.add(event['request']['id'])
+                if not _deliver_notifications(event['request'], event['donors']):
+                    print(f"Could not replay notifications for request {event['request']['id']}")
+            # Anything that failed again now lives in our own journal
+            os.remove(path)
+
+# Pool workers import this module too; replaying is left to the app's own processes
+if multiprocessing.parent_process() is None:
+    replay_pending_notifications()
+atexit.register(drain_notification_queue)
+
+# Batch re-matching: every active request still short of donors (see
+# rematch_donor) is matched again against the current donor pool, in chunks
+# spread over a process pool. Workers keep their own cached tables and only
+# return matches; this process writes the notifications.
+REMATCH_CHUNK_SIZE = 250
+
+def _rematch_chunk(requests):
+    """Nearest donors not notified yet for each request of a chunk (runs in a pool worker)
+
+    Each request is topped up until match_limit of its donors can still
+    answer; donors are never notified of the same request twice.
+    """
+    matches = []
+    for request_data in requests:
+        notifications = read_notifications_for_request(request_data['id'])
+        wanted = match_limit(request_data) - awaiting_response(request_data, notifications)
+        if wanted <= 0:
+            continue
+        notified = {notification['donor_id'] for notification in notifications}
+        donors = [{'donor_id': donor_info['donor_id'], 'distance': donor_info['distance']}
+                  for donor_info in find_compatible_donors(request_data, limit=wanted + len(notified))
+                  if donor_info['donor_id'] not in notified][:wanted]
+        if donors:
+            matches.append(({'id': request_data['id'], 'type': request_data['type']}, donors))
+    return matches
+
+def rematch_active_requests(workers=None, chunk_size=REMATCH_CHUNK_SIZE, pool=None):
+    """Match every active request again and notify donors who were not notified yet
+
+    Chunks run on pool, or on a pool of workers processes started for this
+    run (default: one per CPU); with one worker or one chunk they run here.
+    Each chunk's notifications are written by a batch scheduler job, behind
+    any request matching and fan-outs waiting. Returns counts.
+    """
+    started = time.perf_counter()
+    requests, total = query_csv_data('active_requests', {'status': 'active'})
+    chunks = [requests[start:start + chunk_size] for start in range(0, len(requests), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    report = {'requests': total, 'requests_matched': 0, 'notifications': 0}
+    writes = []
+
+    def record(matches):
+        report['requests_matched'] += len(matches)
+        if matches:
+            writes.append(scheduler.submit('batch', notify_new_matches, matches, 'batch'))
+
+    if pool is None and (workers <= 1 or len(chunks) <= 1):
+        for chunk in chunks:
+            record(_rematch_chunk(chunk))
+    else:
+        own_pool = pool is None
+        if own_pool:
+            pool = multiprocessing.get_context('spawn').Pool(min(workers, len(chunks)))
+        try:
+            for matches in pool.imap_unordered(_rematch_chunk, chunks):
+                record(matches)
+        finally:
+            if own_pool:
+                pool.close()
+                pool.join()
+
+    for write in writes:
+        try:
+            report['notifications'] += write.result()
+        except Exception:
+            pass  # Already reported by the scheduler
+    report['seconds'] = time.perf_counter() - started
+    if metrics:
+        metrics.observe('lifelink_rematch_seconds', report['seconds'])
+    return report
+
+def _rematch_loop(interval, workers):
+    """Re-match active requests every interval seconds, reusing one pool of workers
+
+    Only the process holding the rematch lock runs the job and starts the pool.
+    """
+    pool = None
+    while True:
+        time.sleep(interval)
+        if not _claim_job_lock('rematch'):
+            continue
+        try:
+            if pool is None and workers > 1:
+                pool = multiprocessing.get_context('spawn').Pool(workers)
+            report = rematch_active_requests(workers, pool=pool)
+            if report['notifications']:
+                print(f"Re-matched {report['requests']} active requests: {report['notifications']} "
+                      f"donors notified for {report['requests_matched']} requests in {report['seconds']:.3f}s")
+        except Exception as e:
+            print(f"Error re-matching requests: {e}")
+
+def start_rematch_thread(interval, workers=None):
+    """Run batch re-matching in a background thread"""
+    thread = threading.Thread(target=_rematch_loop, args=(interval, workers or os.cpu_count() or 1),
+                              name='request-rematch', daemon=True)
+    thread.start()
+    return thread
+
+# Background re-matching is off unless an interval in seconds is configured;
+# rematch_requests.py runs the same job from the command line. Pool workers
+# import this module too and must not start jobs of their own.
+REMATCH_INTERVAL = int(os.environ.get('LIFELINK_REMATCH_INTERVAL', '0'))
+REMATCH_WORKERS = int(os.environ.get('LIFELINK_REMATCH_WORKERS', '0')) or None
+if REMATCH_INTERVAL > 0 and multiprocessing.parent_process() is None:
+    start_rematch_thread(REMATCH_INTERVAL, REMATCH_WORKERS)
 
 # Routes
+# Per-route and per-template timings, only hooked up while metrics are on
+if metrics:
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request_time(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            # The rule, not the path, so /request_status/<id> is one series
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            metrics.observe('lifelink_http_request_duration_seconds', time.perf_counter() - started,
+                            route=route, method=request.method, status=response.status_code)
+        return response
+
+    def _start_template_timer(sender, template, context, **extra):
+        g.template_started = time.perf_counter()
+
+    def _record_template_time(sender, template, context, **extra):
+        started = g.pop('template_started', None)
+        if started is not None:
+            metrics.observe('lifelink_template_render_seconds', time.perf_counter() - started,
+                            template=template.name)
+
+    before_render_template.connect(_start_template_timer, app)
+    template_rendered.connect(_record_template_time, app)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not metrics:
+        return 'Metrics are disabled; start the app with LIFELINK_METRICS=1\n', 404
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/')
 def home():
-    donors = read_csv_data('donors')
-    active_requests = read_csv_data('active_requests')
-    accepted_matches = read_csv_data('accepted_matches')
-    blood_banks = read_csv_data('blood_banks')
-
     stats = {
-        'total_donors': len(donors),
-        'total_requests': len(active_requests),
-        'successful_matches': len(accepted_matches),
-        'blood_banks': len(blood_banks)
+        'total_donors': count_csv_rows('donors'),
+        'total_requests': count_csv_rows('active_requests') + count_csv_rows('archived_requests'),
+        'successful_matches': count_csv_rows('accepted_matches'),
+        'blood_banks': count_csv_rows('blood_banks')
     }
     return render_template('index.html', stats=stats)
 
@@ -293,8 +2677,19 @@ def home():
 def register():
     return render_template('register.html', cities=CITIES, organs=ORGANS)
 
+def _form_location(city, place):
+    """Coordinates from the form's "use my location" button, else geocoded offline"""
+    try:
+        lat, lon = float(request.form['lat']), float(request.form['lon'])
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            return round(lat, 6), round(lon, 6)
+    except (KeyError, ValueError):
+        pass
+    return geocode(city, place) or (None, None)
+
 @app.route('/submit_donor', methods=['POST'])
 def submit_donor():
+    lat, lon = _form_location(request.form['city'], request.form['address'])
     donor_data = {
         'id': str(uuid.uuid4()),
         'name': request.form['name'],
@@ -304,6 +2699,8 @@ def submit_donor():
         'gender': request.form['gender'],
         'city': request.form['city'],
         'address': request.form['address'],
+        'lat': lat,
+        'lon': lon,
         'blood_group': request.form.get('blood_group', ''),
         'organs': request.form.getlist('organs'),
         'medical_history': request.form.get('medical_history', ''),
@@ -315,6 +2712,17 @@ def submit_donor():
     add_csv_record('donors', donor_data)
     session['donor_id'] = donor_data['id']
     flash('Registration successful! You are now registered as a donor.', 'success')
+
+    # Requests still looking for donors hear about this one straight away,
+    # behind any request matching already waiting. The donor is saved by
+    # now, so a slow job or one that failed (the scheduler reports it) only
+    # means there is no count to show.
+    try:
+        matched_requests = scheduler.submit('moderate', rematch_donor, donor_data).result(MATCH_WAIT_SECONDS)
+    except Exception:
+        matched_requests = 0
+    if matched_requests:
+        flash(f'{matched_requests} open requests near you need your help.', 'info')
     return redirect(url_for('donor_dashboard'))
 
 @app.route('/request')
@@ -323,6 +2731,7 @@ def request_donation():
 
 @app.route('/submit_request', methods=['POST'])
 def submit_request():
+    lat, lon = _form_location(request.form['city'], request.form['hospital'])
     request_data = {
         'id': str(uuid.uuid4()),
         'patient_name': request.form['patient_name'],
@@ -331,10 +2740,12 @@ def submit_request():
         'email': request.form['email'],
         'city': request.form['city'],
         'hospital': request.form['hospital'],
+        'lat': lat,
+        'lon': lon,
         'type': request.form['type'],
         'urgency': request.form['urgency'],
         'quantity': int(request.form.get('quantity', 1)),
-        'max_distance': int(request.form.get('max_distance', 50)),
+        'max_distance': min(MAX_SEARCH_DISTANCE_KM, max(1, int(request.form.get('max_distance', 50)))),
         'additional_info': request.form.get('additional_info', ''),
         'status': 'active',
         'matched_donor': '',
@@ -351,12 +2762,21 @@ def submit_request():
     add_csv_record('active_requests', request_data)
 
     # Find compatible donors and send notifications
-    compatible_donors = find_compatible_donors(request_data)
-    if compatible_donors:
-        send_notifications_to_donors(request_data['id'], compatible_donors)
-        flash(f'Request submitted successfully! {len(compatible_donors)} compatible donors have been notified.', 'success')
+    # Only the nearest donors the request needs are notified first. Matching
+    # is scheduled at the request's urgency, so critical requests go ahead of
+    # a backlog; the page waits briefly for it to report the donors found.
+    matching = scheduler.submit(request_priority(request_data), match_and_notify, request_data)
+    # The request is saved by now, so a job that failed (the scheduler
+    # reports it) reads to the user like a slow one.
+    try:
+        compatible_donors = matching.result(MATCH_WAIT_SECONDS)
+    except Exception:
+        flash('Request submitted! Compatible donors are being matched and will be notified shortly.', 'success')
     else:
-        flash('Request submitted, but no compatible donors found nearby. We will continue looking.', 'warning')
+        if compatible_donors:
+            flash(f'Request submitted successfully! {len(compatible_donors)} compatible donors are being notified.', 'success')
+        else:
+            flash('Request submitted, but no compatible donors found nearby. We will continue looking.', 'warning')
 
     session['request_id'] = request_data['id']
     return redirect(url_for('request_status', request_id=request_data['id']))
@@ -367,13 +2787,17 @@ def donor_dashboard():
     if not donor_id:
         return redirect(url_for('register'))
 
-    donors = read_csv_data('donors')
-    if donor_id not in donors:
+    donor = read_csv_record('donors', donor_id)
+    if donor is None:
         return redirect(url_for('register'))
 
-    donor = donors[donor_id]
     donor_notifications = read_notifications_for_donor(donor_id)
-    active_requests = read_csv_data('active_requests')
+    # Only the requests the donor was notified of, each looked up by id
+    active_requests = {}
+    for notification in donor_notifications:
+        request_id = notification['request_id']
+        if request_id not in active_requests:
+            active_requests[request_id] = read_csv_record('active_requests', request_id)
 
     return render_template('donor_dashboard.html', 
                          donor=donor, 
@@ -384,78 +2808,81 @@ def donor_dashboard():
 def accept_request():
     donor_id = session.get('donor_id')
     request_id = request.form['request_id']
-    notification_id = request.form['notification_id']
-
-    active_requests = read_csv_data('active_requests')
+    notification_id = request.form.get('notification_id')
 
-    if donor_id and request_id in active_requests:
-        # Update notification status
-        notifications = read_csv_data('notifications')
-        for notif_id, notification in notifications.items():
-            if notification['id'] == notification_id and notification['donor_id'] == donor_id:
-                notification['status'] = 'accepted'
-                write_csv_data('notifications', notifications)
-                break
-
-        # Create match
-        match_id = str(uuid.uuid4())
-        match_data = {
-            'id': match_id,
-            'donor_id': donor_id,
-            'request_id': request_id,
-            'matched_date': datetime.now().isoformat(),
-            'status': 'matched'
-        }
-        add_csv_record('accepted_matches', match_data)
-
-        # Update request status
-        active_requests[request_id]['status'] = 'matched'
-        active_requests[request_id]['matched_donor'] = donor_id
-        write_csv_data('active_requests', active_requests)
-
-        flash('You have successfully accepted the donation request! The recipient has been notified.', 'success')
+    if donor_id:
+        if accept_donation_request(donor_id, request_id, notification_id):
+            flash('You have successfully accepted the donation request! The recipient has been notified.', 'success')
+        else:
+            flash('This request has already been matched or is no longer open. Thank you for responding!', 'warning')
 
     return redirect(url_for('donor_dashboard'))
 
 @app.route('/request_status/<request_id>')
 def request_status(request_id):
-    active_requests = read_csv_data('active_requests')
-    if request_id not in active_requests:
+    request_data = (read_csv_record('active_requests', request_id)
+                    or read_csv_record('archived_requests', request_id))
+    if request_data is None:
         return redirect(url_for('home'))
 
-    request_data = active_requests[request_id]
     matched_donor = None
 
     if request_data.get('matched_donor'):
-        donors = read_csv_data('donors')
-        matched_donor = donors.get(request_data['matched_donor'])
+        matched_donor = read_csv_record('donors', request_data['matched_donor'])
 
     return render_template('request_status.html', request=request_data, matched_donor=matched_donor)
 
+# Rows shown per page of the donor and request listings, and the most a
+# page may ask for with ?per_page=
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+def _query_int(name, default, low, high):
+    """Read an integer query parameter, clamped to [low, high]"""
+    try:
+        return min(high, max(low, int(request.args.get(name, default))))
+    except ValueError:
+        return default
+
+def _listing_page(file_type, filter_fields):
+    """One page of a table filtered by the query string
+
+    Returns (rows, filters as given, pagination details).
+    """
+    filters = {field: request.args[field] for field in filter_fields if request.args.get(field)}
+    # Page bounded so its last row offset still fits islice and SQLite integers
+    page = _query_int('page', 1, 1, sys.maxsize // MAX_PAGE_SIZE)
+    per_page = _query_int('per_page', PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    # Filter values are typed the way stored rows are (available -> bool)
+    rows, total = query_csv_data(file_type, _convert_row(file_type, dict(filters)),
+                                 offset=(page - 1) * per_page, limit=per_page)
+    pagination = {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': max(1, -(-total // per_page))
+    }
+    return rows, filters, pagination
+
 @app.route('/all_requests')
 def all_requests():
-    active_requests = read_csv_data('active_requests')
-    return render_template('all_requests.html', requests=active_requests)
+    requests, filters, pagination = _listing_page('active_requests', ('type', 'urgency', 'status', 'city'))
+    return render_template('all_requests.html', requests=requests, filters=filters,
+                           pagination=pagination, stats=request_stats(), cities=CITIES)
 
 @app.route('/all_donors')
 def all_donors():
-    donors = read_csv_data('donors')
-    return render_template('all_donors.html', donors=donors)
+    donors, filters, pagination = _listing_page('donors', ('available', 'blood_group', 'city'))
+    return render_template('all_donors.html', donors=donors, filters=filters, pagination=pagination,
+                           stats=donor_stats(), blood_groups=list(BLOOD_COMPATIBILITY), cities=CITIES)
 
 @app.route('/api/stats')
 def api_stats():
-    donors = read_csv_data('donors')
-    active_requests = read_csv_data('active_requests')
-    accepted_matches = read_csv_data('accepted_matches')
-    blood_banks = read_csv_data('blood_banks')
-
-    active_count = sum(1 for r in active_requests.values() if r.get('status') == 'active')
-
     return jsonify({
-        'donors': len(donors),
-        'active_requests': active_count,
-        'matches': len(accepted_matches),
-        'blood_banks': len(blood_banks)
+        'donors': count_csv_rows('donors'),
+        'active_requests': count_csv_rows('active_requests', status='active'),
+        'matches': count_csv_rows('accepted_matches'),
+        'blood_banks': count_csv_rows('blood_banks')
     })
 
 if __name__ == '__main__':
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+LifeLink - bulk import donors, requests or any other table
+Streams rows from a CSV or JSON Lines file into the configured storage
+(CSV files or SQLite) in batches, so memory use stays flat no matter how
+large the input is. Every row is validated against CSV_FIELDS and checked
+to convert back exactly as read_csv_data would; bad rows are reported and
+skipped.
+
+Usage: python bulk_import.py donors registry.jsonl [--batch-size 5000]
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import blood_donation_app_csv as lifelink
+
+# Values filled in when an imported row leaves them empty, matching what
+# the registration and request forms set for new rows
+IMPORT_DEFAULTS = {
+    'donors': {'available': True, 'registered_date': lambda: datetime.now().isoformat()},
+    'active_requests': {'status': 'active', 'created_date': lambda: datetime.now().isoformat()}
+}
+
+# The field geocoded together with the city when a row has no coordinates
+GEOCODE_FIELDS = {'donors': 'address', 'active_requests': 'hospital'}
+
+def read_rows(path, input_format):
+    """Yield (line_number, row dict) from a CSV or JSON Lines file, one at a time"""
+    with open(path, 'r', newline='', encoding='utf-8') as source:
+        if input_format == 'csv':
+            for line_number, row in enumerate(csv.DictReader(source), 2):
+                yield line_number, row
+        else:
+            for line_number, line in enumerate(source, 1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+
+def prepare_row(table, row, ignore_unknown):
+    """Fill defaults, ids and coordinates, then validate a row for the table"""
+    fields = lifelink.CSV_FIELDS[table]
+    if ignore_unknown:
+        row = {field: value for field, value in row.items() if field in fields}
+    if not row.get('id'):
+        row['id'] = str(uuid.uuid4())
+    for field, default in IMPORT_DEFAULTS.get(table, {}).items():
+        if row.get(field) in (None, ''):
+            row[field] = default() if callable(default) else default
+    place_field = GEOCODE_FIELDS.get(table)
+    if place_field and row.get('lat') in (None, '') and row.get('lon') in (None, ''):
+        location = lifelink.geocode(row.get('city', ''), row.get(place_field) or '')
+        if location:
+            row['lat'], row['lon'] = location
+    return lifelink.validate_record(table, row)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import rows into LifeLink storage")
+    parser.add_argument('table', choices=sorted(lifelink.CSV_FILES))
+    parser.add_argument('input', help="CSV file with a header row, or JSON Lines (.jsonl)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'],
+                        help="input format (default: guessed from the file extension)")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--ignore-unknown-fields', action='store_true',
+                        help="drop columns the table does not have instead of rejecting the row")
+    parser.add_argument('--progress-every', type=float, default=2.0,
+                        help="seconds between progress lines")
+    args = parser.parse_args()
+
+    input_format = args.format or ('jsonl' if args.input.endswith(('.jsonl', '.ndjson')) else 'csv')
+    print(f"Importing {args.input} ({input_format}) into {args.table} "
+          f"using the {lifelink.storage.name} backend")
+
+    imported = rejected = 0
+    batch = []
+    started = last_report = time.perf_counter()
+
+    def flush():
+        nonlocal imported
+        if batch:
+            if not lifelink.add_csv_records(args.table, batch):
+                sys.exit(f"Stopping: writing a batch to {args.table} failed")
+            imported += len(batch)
+            batch.clear()
+
+    try:
+        for line_number, row in read_rows(args.input, input_format):
+            try:
+                batch.append(prepare_row(args.table, row, args.ignore_unknown_fields))
+            except (ValueError, TypeError, AttributeError) as e:
+                rejected += 1
+                print(f"  line {line_number}: skipped ({e})")
+                continue
+            if len(batch) >= args.batch_size:
+                flush()
+                now = time.perf_counter()
+                if now - last_report >= args.progress_every:
+                    print(f"  {imported:,} rows imported, {rejected:,} rejected "
+                          f"({imported / (now - started):,.0f} rows/s)")
+                    last_report = now
+        flush()
+    except json.JSONDecodeError as e:
+        flush()
+        sys.exit(f"Stopping at invalid JSON after {imported:,} rows: {e}")
+
+    elapsed = time.perf_counter() - started
+    print(f"Done: {imported:,} rows imported, {rejected:,} rejected in {elapsed:.1f}s "
+          f"({imported / elapsed if elapsed else 0:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+LifeLink - matching equivalence check
+Seeds a donor pool with generate_sample_data on each storage backend and
+checks that find_compatible_donors returns exactly the donors a brute-force
+scan of the whole table finds, in the same order and with the same
+distances. Both the NumPy engine (CSV backend, when NumPy is installed) and
+the grid index path are checked, with and without a limit.
+
+Usage: python check_matching.py [--donors N] [--requests N] [--seed N] [--backends csv,sqlite]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _import_modules():
+    """Import the app and the sample data generator from the repository"""
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    import blood_donation_app_csv
+    import generate_sample_data
+    return blood_donation_app_csv, generate_sample_data
+
+def _brute_force(lifelink, donors, request_data):
+    """Every available compatible donor within range, nearest first, from a full scan"""
+    location = lifelink.row_location(request_data)
+    if location is None:
+        return []
+    if request_data['type'] == 'blood':
+        wanted = lifelink.compatible_blood_groups(request_data['blood_group'])
+        compatible = lambda donor: donor['blood_group'] in wanted
+    else:
+        compatible = lambda donor: request_data['organ'] in donor['organs']
+    max_distance = lifelink.request_max_distance(request_data)
+
+    found = []
+    for donor in donors:
+        donor_location = lifelink.row_location(donor)
+        if donor['available'] is not True or not compatible(donor) or donor_location is None:
+            continue
+        distance = lifelink.calculate_distance(donor_location[0], donor_location[1], location[0], location[1])
+        if distance <= max_distance:
+            found.append((donor['id'], round(distance, 2)))
+    found.sort(key=lambda match: match[1])
+    return found
+
+def _check_backend(backend, num_donors, num_requests, seed, results):
+    """Seed a scratch directory on one backend and compare every search path"""
+    os.chdir(tempfile.mkdtemp(prefix=f'lifelink-check-{backend}-'))
+    os.environ['LIFELINK_STORAGE'] = backend
+    lifelink, generator = _import_modules()
+    generator.write_sample_data(num_donors, num_requests, seed, progress_every=None)
+
+    donors = list(lifelink.read_csv_data('donors').values())
+    requests = list(lifelink.read_csv_data('active_requests').values())
+    # The NumPy engine takes over from VECTORIZED_MATCH_MIN_DONORS donors,
+    # so moving the threshold either side of the pool picks the path
+    paths = {'index': len(donors) + 1}
+    if lifelink.np is not None and lifelink.storage.donor_columns(0) is not None:
+        paths['numpy'] = 0
+
+    failures = []
+    checked = 0
+    for request_data in requests:
+        expected = _brute_force(lifelink, donors, request_data)
+        for path, threshold in paths.items():
+            lifelink.VECTORIZED_MATCH_MIN_DONORS = threshold
+            for limit in (None, 1, lifelink.match_limit(request_data)):
+                found = [(match['donor_id'], match['distance'])
+                         for match in lifelink.find_compatible_donors(request_data, limit=limit)]
+                want = expected if limit is None else expected[:limit]
+                checked += 1
+                if found != want:
+                    failures.append(f"{backend} {path} limit={limit} request {request_data['id']}: "
+                                    f"expected {len(want)} donors, got {len(found)} "
+                                    f"(first difference at {_first_difference(want, found)})")
+    results.put((backend, sorted(paths), len(donors), len(requests), checked, failures))
+
+def _first_difference(expected, found):
+    """Position of the first entry where two match lists disagree"""
+    for position, (want, got) in enumerate(zip(expected, found)):
+        if want != got:
+            return position
+    return min(len(expected), len(found))
+
+def main():
+    parser = argparse.ArgumentParser(description="Check LifeLink matching paths against a brute-force scan")
+    parser.add_argument('--donors', type=int, default=6000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--backends', default='csv,sqlite')
+    args = parser.parse_args()
+
+    # Each backend runs in a fresh process, since storage is picked on import
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    failures = []
+    for backend in args.backends.split(','):
+        process = context.Process(target=_check_backend,
+                                  args=(backend, args.donors, args.requests, args.seed, results))
+        process.start()
+        backend, paths, donors, requests, checked, backend_failures = results.get()
+        process.join()
+        print(f"{backend}: {donors} donors, {requests} requests, {checked} searches "
+              f"through {', '.join(paths)} checked")
+        failures.extend(backend_failures)
+
+    if failures:
+        print("FAILED")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("OK: every search path matches the brute-force scan")
+
+if __name__ == "__main__":
+    main()
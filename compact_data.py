@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+LifeLink - compact the CSV data files
+Folds update logs and superseded rows back into each table and moves
+closed requests (and their notifications) into the archive tables.
+Safe to run while the app is serving; readers wait only for each file swap.
+"""
+
+import argparse
+
+from blood_donation_app_csv import ARCHIVE_AFTER_DAYS, CSV_FILES, compact_all_tables, compact_table
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact LifeLink CSV data files")
+    parser.add_argument('--table', choices=sorted(CSV_FILES),
+                        help="compact only this table (no archiving)")
+    parser.add_argument('--archive-after-days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help=f"archive closed requests older than this (default {ARCHIVE_AFTER_DAYS})")
+    parser.add_argument('--force', action='store_true',
+                        help="rewrite tables even when there is nothing to fold")
+    args = parser.parse_args()
+
+    if args.table:
+        reports = [compact_table(args.table, force=args.force)]
+    else:
+        reports = compact_all_tables(args.archive_after_days, force=args.force)
+
+    total_reclaimed = 0
+    total_seconds = 0.0
+    for report in reports:
+        total_reclaimed += report['bytes_reclaimed']
+        total_seconds += report['seconds']
+        print(f"{report['table']:<24} {report['bytes_before']:>10} -> {report['bytes_after']:>10} bytes"
+              f"  ({report['bytes_reclaimed']} reclaimed, {report['rows_archived']} archived,"
+              f" {report['seconds']:.3f}s)")
+    print(f"Compaction complete: {total_reclaimed} bytes reclaimed in {total_seconds:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""
+LifeLink - export the SQLite database to the CSV files in data/
+Only needed when running with LIFELINK_STORAGE=sqlite; the CSV engine
+already keeps its data in those files.
+"""
+
+import blood_donation_app_csv as lifelink
+
+def main():
+    if lifelink.storage.name != 'sqlite':
+        print("Storage backend is CSV; the files in data/ are already up to date.")
+        return
+    lifelink.storage.export_csv()
+    for file_type, filepath in lifelink.CSV_FILES.items():
+        print(f"Exported {len(lifelink.read_csv_data(file_type))} rows to {filepath}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,22 @@
 
 # Sample Data Generator for LifeLink Blood/Organ Donation System
-# Run this after starting the main application to populate with demo data
-
+# Streams a seeded, reproducible dataset of donors, requests, notifications
+# and matches into the configured storage. Small runs make demo data; runs of
+# 10^5-10^7 rows are what the benchmarks and scaling tests are built on.
+#
+# Usage: python generate_sample_data.py --donors 1000000 --requests 100000 --seed 7
+
+import argparse
+import hashlib
 import random
-from datetime import datetime, timedelta
+import time
 import uuid
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+import blood_donation_app_csv as lifelink
 
 # Sample data for demonstration
 SAMPLE_DONOR_NAMES = [
@@ -14,11 +26,6 @@ SAMPLE_DONOR_NAMES = [
     "Sunita Rao", "Manish Kapoor", "Asha Bhatt", "Kiran Kumar", "Neha Bansal"
 ]
 
-SAMPLE_CITIES = [
-    "Mumbai", "Delhi", "Bangalore", "Chennai", "Kolkata", "Hyderabad", 
-    "Pune", "Ahmedabad", "Jaipur", "Lucknow", "Kanpur", "Nagpur"
-]
-
 BLOOD_GROUPS = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
 
 ORGANS = ["Heart", "Kidney", "Liver", "Lungs", "Pancreas", "Cornea", "Bone Marrow", "Skin"]
@@ -29,87 +36,175 @@ HOSPITALS = [
     "Kokilaben Hospital", "Ruby Hall Clinic", "Global Hospital", "Care Hospital"
 ]
 
-def generate_sample_donors(num_donors=50):
-    """Generate sample donor data"""
-    sample_donors = {}
+# Rough share of donors in each city, weighted by population
+CITY_WEIGHTS = {
+    'Mumbai': 12.4, 'Delhi': 11.0, 'Bangalore': 8.4, 'Chennai': 4.6, 'Kolkata': 4.5,
+    'Hyderabad': 6.8, 'Pune': 3.1, 'Ahmedabad': 5.6, 'Jaipur': 3.0, 'Lucknow': 2.8,
+    'Kanpur': 2.8, 'Nagpur': 2.4, 'Indore': 2.0, 'Thane': 1.8, 'Bhopal': 1.8,
+    'Visakhapatnam': 1.7, 'Pimpri': 1.7, 'Patna': 1.7
+}
+
+# Blood group frequencies in the Indian population (percent)
+BLOOD_GROUP_WEIGHTS = {
+    "A+": 22.1, "A-": 1.0, "B+": 32.1, "B-": 1.2,
+    "AB+": 7.7, "AB-": 0.4, "O+": 35.8, "O-": 1.4
+}
+
+# Most donors pledge no organs or one or two
+ORGAN_COUNT_WEIGHTS = [40, 25, 15, 12, 8]
+
+# Notifications sent for each generated request, at most
+NOTIFICATIONS_PER_REQUEST = 5
+
+# Generated donors and requests are scattered up to this many degrees of
+# latitude and longitude around their city centre
+LOCATION_JITTER_DEGREES = 0.1
+
+# Tables the generator writes, in the order they are filled
+GENERATED_TABLES = ['donors', 'active_requests', 'notifications', 'accepted_matches']
+
+CITY_CUM_WEIGHTS = list(accumulate(CITY_WEIGHTS[city] for city in lifelink.CITIES))
+BLOOD_GROUP_CUM_WEIGHTS = list(accumulate(BLOOD_GROUP_WEIGHTS[bg] for bg in BLOOD_GROUPS))
+
+def row_id(seed, kind, number):
+    """Deterministic id for the nth generated row of a kind"""
+    digest = hashlib.md5(f"{seed}:{kind}:{number}".encode()).digest()
+    return str(uuid.UUID(bytes=digest, version=4))
+
+def generated_location(seed, kind, number, city):
+    """Deterministic (lat, lon) near the city centre for the nth generated row of a kind
+
+    Derived from a hash rather than the row's random stream, so the request
+    generator can recompute a donor's location from its number alone.
+    """
+    digest = hashlib.md5(f"{seed}:{kind}-location:{number}".encode()).digest()
+    lat, lon = lifelink.CITY_COORDINATES[city]
+    lat_offset = (int.from_bytes(digest[:4], 'big') / 0xFFFFFFFF * 2 - 1) * LOCATION_JITTER_DEGREES
+    lon_offset = (int.from_bytes(digest[4:8], 'big') / 0xFFFFFFFF * 2 - 1) * LOCATION_JITTER_DEGREES
+    return round(lat + lat_offset, 4), round(lon + lon_offset, 4)
+
+def iter_donors(num_donors, seed, as_of):
+    """Yield generated donors one at a time"""
+    rng = random.Random(f"{seed}:donors")
+    cities, groups = lifelink.CITIES, BLOOD_GROUPS
 
     for i in range(num_donors):
-        donor_id = str(uuid.uuid4())
-
         # Random donor data
-        name = random.choice(SAMPLE_DONOR_NAMES)
-        city = random.choice(SAMPLE_CITIES)
-        blood_group = random.choice(BLOOD_GROUPS)
-        age = random.randint(18, 60)
-        gender = random.choice(["male", "female"])
+        name = rng.choice(SAMPLE_DONOR_NAMES)
+        city = rng.choices(cities, cum_weights=CITY_CUM_WEIGHTS)[0]
+        blood_group = rng.choices(groups, cum_weights=BLOOD_GROUP_CUM_WEIGHTS)[0]
+        age = int(rng.triangular(18, 60, 28))
+        gender = rng.choice(["male", "female"])
 
         # Random organs (0-4 organs per donor)
-        num_organs = random.randint(0, 4)
-        organs = random.sample(ORGANS, num_organs)
+        num_organs = rng.choices(range(5), weights=ORGAN_COUNT_WEIGHTS)[0]
+        organs = rng.sample(ORGANS, num_organs)
 
         # Generate email and phone
-        email = f"{name.lower().replace(' ', '').replace('.', '')}{random.randint(10, 99)}@email.com"
-        phone = f"+91-{random.randint(70, 99)}{random.randint(1000, 9999)}{random.randint(1000, 9999)}"
+        email = f"{name.lower().replace(' ', '').replace('.', '')}{i}@email.com"
+        phone = f"+91-{rng.randint(70, 99)}{rng.randint(1000, 9999)}{rng.randint(1000, 9999)}"
+
+        lat, lon = generated_location(seed, 'donor', i, city)
 
         # Last donation date (some donors, not all)
         last_donation = None
-        if random.choice([True, False]):
-            days_ago = random.randint(30, 365)
-            last_donation = (datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+        if rng.random() < 0.5:
+            last_donation = (as_of - timedelta(days=rng.randint(30, 365))).strftime("%Y-%m-%d")
 
-        donor_data = {
-            'id': donor_id,
+        yield {
+            'id': row_id(seed, 'donor', i),
             'name': name,
             'email': email,
             'phone': phone,
             'age': age,
             'gender': gender,
             'city': city,
-            'address': f"{random.randint(1, 999)} {random.choice(['MG Road', 'Park Street', 'Mall Road', 'Station Road'])}, {city}",
+            'address': f"{rng.randint(1, 999)} {rng.choice(['MG Road', 'Park Street', 'Mall Road', 'Station Road'])}, {city}",
+            'lat': lat,
+            'lon': lon,
             'blood_group': blood_group,
             'organs': organs,
-            'medical_history': random.choice([
-                "", 
-                "No significant medical history", 
+            'medical_history': rng.choice([
+                "",
+                "No significant medical history",
                 "Hypertension controlled with medication",
                 "Diabetic, well controlled",
                 "Occasional allergies"
             ]),
             'last_donation': last_donation,
-            'available': random.choice([True, True, True, False]),  # 75% available
-            'registered_date': (datetime.now() - timedelta(days=random.randint(1, 730))).isoformat()
+            'available': rng.random() < 0.75,  # 75% available
+            'registered_date': (as_of - timedelta(days=rng.randint(1, 730), seconds=rng.randint(0, 86399))).isoformat()
         }
 
-        sample_donors[donor_id] = donor_data
-
-    return sample_donors
-
-def generate_sample_requests(num_requests=20):
-    """Generate sample donation requests"""
-    sample_requests = {}
+def index_donor(donor_index, number, donor):
+    """Add an available donor to the compact donor index
+
+    The index maps (city, blood group) and (city, organ) to arrays of donor
+    numbers; ids are rebuilt with row_id, so millions of donors fit in a few
+    tens of megabytes.
+    """
+    if not donor['available']:
+        return
+    city = donor['city']
+    for key in [(city, donor['blood_group'])] + [(city, organ) for organ in donor['organs']]:
+        bucket = donor_index.get(key)
+        if bucket is None:
+            bucket = donor_index[key] = array('I')
+        bucket.append(number)
+
+def _city_distance(city_a, city_b):
+    """Distance in km between two city centres; infinite if either has no coordinates"""
+    coords_a = lifelink.get_city_coordinates(city_a)
+    coords_b = lifelink.get_city_coordinates(city_b)
+    if coords_a is None or coords_b is None:
+        return float('inf')
+    return lifelink.calculate_distance(coords_a[0], coords_a[1], coords_b[0], coords_b[1])
+
+def _nearby_cities(max_distance):
+    """Map each city to the cities whose generated rows can lie within max_distance km of its rows"""
+    # Two rows can each sit a jitter's diagonal away from their centres
+    margin = 2 * lifelink.calculate_distance(0, 0, LOCATION_JITTER_DEGREES, LOCATION_JITTER_DEGREES)
+    return {city: [other for other in lifelink.CITIES
+                   if _city_distance(city, other) <= max_distance + margin]
+            for city in lifelink.CITIES}
+
+def iter_requests(num_requests, seed, as_of, donor_index=None,
+                  notifications_per_request=NOTIFICATIONS_PER_REQUEST):
+    """Yield (request, notifications, match) tuples one at a time
+
+    Donors are notified the way the app would: available, compatible and
+    within the request's max distance of its location. About a quarter of
+    requests that notified someone are matched to the first donor notified.
+    """
+    rng = random.Random(f"{seed}:requests")
+    donor_index = donor_index or {}
+    nearby = {distance: _nearby_cities(distance) for distance in (25, 50, 100)}
 
     for i in range(num_requests):
-        request_id = str(uuid.uuid4())
+        request_id = row_id(seed, 'request', i)
 
         # Random request data
-        request_type = random.choice(["blood", "blood", "blood", "organ"])  # More blood requests
-        city = random.choice(SAMPLE_CITIES)
-        hospital = random.choice(HOSPITALS)
-        urgency = random.choice(["critical", "urgent", "urgent", "moderate"])  # Weight toward urgent
+        request_type = rng.choice(["blood", "blood", "blood", "organ"])  # More blood requests
+        city = rng.choices(lifelink.CITIES, cum_weights=CITY_CUM_WEIGHTS)[0]
+        hospital = rng.choice(HOSPITALS)
+        lat, lon = generated_location(seed, 'request', i, city)
+        urgency = rng.choice(["critical", "urgent", "urgent", "moderate"])  # Weight toward urgent
 
         # Patient names
-        patient_name = random.choice([
+        patient_name = rng.choice([
             "Rahul Kumar", "Sunita Sharma", "Vikash Patel", "Meera Gupta", "Arjun Singh",
             "Kavya Reddy", "Rohit Verma", "Anita Joshi", "Sanjay Malhotra", "Deepika Nair"
         ])
 
-        contact_person = random.choice([
-            "Dr. " + random.choice(["Sharma", "Patel", "Kumar", "Singh", "Gupta"]),
+        contact_person = rng.choice([
+            "Dr. " + rng.choice(["Sharma", "Patel", "Kumar", "Singh", "Gupta"]),
             patient_name + "'s family member"
         ])
 
-        phone = f"+91-{random.randint(70, 99)}{random.randint(1000, 9999)}{random.randint(1000, 9999)}"
-        email = f"contact{random.randint(100, 999)}@{hospital.lower().replace(' ', '').replace('.', '')}.com"
+        phone = f"+91-{rng.randint(70, 99)}{rng.randint(1000, 9999)}{rng.randint(1000, 9999)}"
+        email = f"contact{rng.randint(100, 999)}@{hospital.lower().replace(' ', '').replace('.', '')}.com"
+        max_distance = rng.choice([25, 50, 100])
+        created = as_of - timedelta(hours=rng.randint(1, 48), seconds=rng.randint(0, 3599))
 
         request_data = {
             'id': request_id,
@@ -119,11 +214,13 @@ def generate_sample_requests(num_requests=20):
             'email': email,
             'city': city,
             'hospital': hospital,
+            'lat': lat,
+            'lon': lon,
             'type': request_type,
             'urgency': urgency,
-            'quantity': random.randint(1, 4) if request_type == 'blood' else 1,
-            'max_distance': random.choice([25, 50, 100]),
-            'additional_info': random.choice([
+            'quantity': rng.randint(1, 4) if request_type == 'blood' else 1,
+            'max_distance': max_distance,
+            'additional_info': rng.choice([
                 "Patient needs immediate assistance due to emergency surgery",
                 "Regular dialysis patient requiring weekly donation",
                 "Post-accident patient in ICU, critical condition",
@@ -131,48 +228,167 @@ def generate_sample_requests(num_requests=20):
                 "Scheduled surgery next week, please arrange donation",
                 "Elderly patient with complications, urgent care needed"
             ]),
-            'status': random.choice(['active', 'active', 'active', 'matched']),  # Mostly active
-            'created_date': (datetime.now() - timedelta(hours=random.randint(1, 48))).isoformat()
+            'status': 'active',
+            'created_date': created.isoformat()
         }
 
         if request_type == 'blood':
-            request_data['blood_group'] = random.choice(BLOOD_GROUPS)
+            request_data['blood_group'] = rng.choices(BLOOD_GROUPS, cum_weights=BLOOD_GROUP_CUM_WEIGHTS)[0]
+            wanted = lifelink.BLOOD_COMPATIBILITY[request_data['blood_group']]
         else:
-            request_data['organ'] = random.choice(ORGANS)
-
-        sample_requests[request_id] = request_data
-
-    return sample_requests
+            request_data['organ'] = rng.choice(ORGANS)
+            wanted = [request_data['organ']]
+
+        # Pick donors uniformly from every compatible bucket that can be in
+        # range, keeping those that really are; a few draws per notification
+        # leaves requests in sparse areas with fewer
+        buckets = [(bucket, other) for other in nearby[max_distance][city]
+                   for value in wanted
+                   for bucket in [donor_index.get((other, value))] if bucket]
+        total = sum(len(bucket) for bucket, _ in buckets)
+        chosen = {}
+        for _ in range(4 * notifications_per_request if total else 0):
+            if len(chosen) == notifications_per_request:
+                break
+            position = rng.randrange(total)
+            for bucket, other in buckets:
+                if position < len(bucket):
+                    number = bucket[position]
+                    donor_lat, donor_lon = generated_location(seed, 'donor', number, other)
+                    distance = lifelink.calculate_distance(donor_lat, donor_lon, lat, lon)
+                    if distance <= max_distance:
+                        chosen.setdefault(number, round(distance, 2))
+                    break
+                position -= len(bucket)
+
+        timestamp = (created + timedelta(seconds=1)).isoformat()
+        notifications = [{
+            'id': row_id(seed, 'notification', f"{i}:{number}"),
+            'donor_id': row_id(seed, 'donor', number),
+            'request_id': request_id,
+            'message': f"Urgent request for {request_type} donation",
+            'distance': distance,
+            'timestamp': timestamp,
+            'status': 'pending'
+        } for number, distance in chosen.items()]
+
+        match = None
+        if notifications and rng.random() < 0.25:
+            notifications[0]['status'] = 'accepted'
+            request_data['status'] = 'matched'
+            request_data['matched_donor'] = notifications[0]['donor_id']
+            match = {
+                'id': row_id(seed, 'match', i),
+                'donor_id': notifications[0]['donor_id'],
+                'request_id': request_id,
+                'matched_date': (created + timedelta(minutes=rng.randint(5, 600))).isoformat(),
+                'status': 'matched'
+            }
+
+        yield request_data, notifications, match
+
+def generate_sample_donors(num_donors=50, seed=None, as_of=None):
+    """Generate sample donor data"""
+    seed = random.randrange(2**32) if seed is None else seed
+    return {donor['id']: donor for donor in iter_donors(num_donors, seed, as_of or datetime.now())}
 
-def print_sample_data_summary(donors, requests):
+def generate_sample_requests(num_requests=20, seed=None, as_of=None):
+    """Generate sample donation requests"""
+    seed = random.randrange(2**32) if seed is None else seed
+    return {request_data['id']: request_data
+            for request_data, _, _ in iter_requests(num_requests, seed, as_of or datetime.now())}
+
+def write_sample_data(num_donors, num_requests, seed, as_of=None, batch_size=5000,
+                      notifications_per_request=NOTIFICATIONS_PER_REQUEST, reset=False,
+                      progress_every=2.0):
+    """Stream a generated dataset into the configured storage
+
+    Rows are written in batches through add_csv_records, so memory stays flat
+    apart from the compact donor index. Returns summary counts.
+    """
+    as_of = as_of or datetime.now()
+    if reset:
+        for table in GENERATED_TABLES:
+            lifelink.write_csv_data(table, {})
+
+    batches = {table: [] for table in GENERATED_TABLES}
+    written = Counter()
+    stats = {'blood_groups': Counter(), 'cities': set(), 'types': Counter(),
+             'urgency': Counter(), 'available': 0}
+    started = last_report = time.perf_counter()
+
+    def flush(table, force=False):
+        nonlocal last_report
+        batch = batches[table]
+        if batch and (force or len(batch) >= batch_size):
+            if not lifelink.add_csv_records(table, batch):
+                raise RuntimeError(f"writing a batch to {table} failed")
+            written[table] += len(batch)
+            batch.clear()
+            now = time.perf_counter()
+            if progress_every is not None and now - last_report >= progress_every:
+                total = sum(written.values())
+                print(f"   {total:,} rows written ({total / (now - started):,.0f} rows/s)")
+                last_report = now
+
+    donor_index = {}
+    for number, donor in enumerate(iter_donors(num_donors, seed, as_of)):
+        index_donor(donor_index, number, donor)
+        stats['blood_groups'][donor['blood_group']] += 1
+        stats['cities'].add(donor['city'])
+        stats['available'] += donor['available']
+        batches['donors'].append(donor)
+        flush('donors')
+    flush('donors', force=True)
+
+    for request_data, notifications, match in iter_requests(
+            num_requests, seed, as_of, donor_index, notifications_per_request):
+        stats['types'][request_data['type']] += 1
+        stats['urgency'][request_data['urgency']] += 1
+        batches['active_requests'].append(request_data)
+        batches['notifications'].extend(notifications)
+        if match:
+            batches['accepted_matches'].append(match)
+        for table in GENERATED_TABLES[1:]:
+            flush(table)
+    for table in GENERATED_TABLES[1:]:
+        flush(table, force=True)
+
+    stats['written'] = written
+    stats['elapsed'] = time.perf_counter() - started
+    return stats
+
+def print_sample_data_summary(stats):
     """Print summary of generated sample data"""
+    written = stats['written']
     print("\n" + "="*50)
     print("📊 SAMPLE DATA GENERATED FOR LIFELINK")
     print("="*50)
 
-    print(f"\n👥 DONORS GENERATED: {len(donors)}")
-    print(f"   • Available: {len([d for d in donors.values() if d['available']])}")
-    print(f"   • Cities: {len(set(d['city'] for d in donors.values()))}")
-
-    blood_groups = {}
-    for donor in donors.values():
-        bg = donor['blood_group']
-        blood_groups[bg] = blood_groups.get(bg, 0) + 1
+    print(f"\n👥 DONORS GENERATED: {written['donors']:,}")
+    print(f"   • Available: {stats['available']:,}")
+    print(f"   • Cities: {len(stats['cities'])}")
 
     print("   • Blood Groups:")
-    for bg, count in sorted(blood_groups.items()):
-        print(f"     - {bg}: {count} donors")
+    for bg, count in sorted(stats['blood_groups'].items()):
+        print(f"     - {bg}: {count:,} donors")
+
+    print(f"\n📋 REQUESTS GENERATED: {written['active_requests']:,}")
+    print(f"   • Blood Requests: {stats['types']['blood']:,}")
+    print(f"   • Organ Requests: {stats['types']['organ']:,}")
+    print(f"   • Critical: {stats['urgency']['critical']:,}")
+    print(f"   • Urgent: {stats['urgency']['urgent']:,}")
 
-    print(f"\n📋 REQUESTS GENERATED: {len(requests)}")
-    print(f"   • Blood Requests: {len([r for r in requests.values() if r['type'] == 'blood'])}")
-    print(f"   • Organ Requests: {len([r for r in requests.values() if r['type'] == 'organ'])}")
-    print(f"   • Critical: {len([r for r in requests.values() if r['urgency'] == 'critical'])}")
-    print(f"   • Urgent: {len([r for r in requests.values() if r['urgency'] == 'urgent'])}")
+    print(f"\n🔔 NOTIFICATIONS: {written['notifications']:,}")
+    print(f"🎯 MATCHES: {written['accepted_matches']:,}")
+
+    total = sum(written.values())
+    elapsed = stats['elapsed']
+    print(f"\n⏱️  {total:,} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)")
 
     print("\n🎯 TO USE THIS DATA:")
-    print("1. Start your Flask app: python blood_donation_app.py")
-    print("2. Run this script to populate data")
-    print("3. Refresh your browser to see populated data")
+    print(f"1. Start your Flask app: python blood_donation_app_csv.py ({lifelink.storage.name} backend)")
+    print("2. Refresh your browser to see populated data")
 
     print("\n💡 DEMO FEATURES TO SHOWCASE:")
     print("• Browse registered donors by blood group")
@@ -182,13 +398,27 @@ def print_sample_data_summary(donors, requests):
     print("• Explore donor dashboard with notifications")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a seeded LifeLink dataset into the configured storage")
+    parser.add_argument('--donors', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--as-of', type=datetime.fromisoformat,
+                        help="date the generated dates count back from (default: today); "
+                             "fix it to reproduce a dataset exactly")
+    parser.add_argument('--notifications-per-request', type=int, default=NOTIFICATIONS_PER_REQUEST)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--reset', action='store_true',
+                        help="empty the donor, request, notification and match tables first")
+    args = parser.parse_args()
+
     # Generate sample data
-    print("🔄 Generating sample data for LifeLink...")
+    print(f"🔄 Generating sample data for LifeLink (seed {args.seed})...")
 
-    donors = generate_sample_donors(50)
-    requests = generate_sample_requests(20)
+    as_of = args.as_of or datetime.combine(datetime.now().date(), datetime.min.time())
+    stats = write_sample_data(args.donors, args.requests, args.seed, as_of, args.batch_size,
+                              args.notifications_per_request, args.reset)
 
-    print_sample_data_summary(donors, requests)
+    print_sample_data_summary(stats)
 
     print("\n✅ Sample data generated successfully!")
     print("🚀 Your LifeLink system now has realistic demo data!")
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+LifeLink - re-match active requests against the current donor pool
+Every active request with fewer donors who can still answer than it needs
+is matched again. Donors who registered since it was submitted, or who were
+passed over for nearer ones who never answered, are notified. The
+requests are split into chunks and matched in a pool of worker processes.
+Safe to run while the app is serving.
+
+Usage: python rematch_requests.py [--workers N] [--chunk-size N]
+"""
+
+import argparse
+
+from blood_donation_app_csv import REMATCH_CHUNK_SIZE, rematch_active_requests
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-match active LifeLink requests against new donors")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: one per CPU; 1 runs in this process)")
+    parser.add_argument('--chunk-size', type=int, default=REMATCH_CHUNK_SIZE,
+                        help=f"requests handed to a worker at a time (default {REMATCH_CHUNK_SIZE})")
+    args = parser.parse_args()
+
+    report = rematch_active_requests(args.workers, args.chunk_size)
+    print(f"Re-matched {report['requests']} active requests: {report['notifications']} donors notified "
+          f"for {report['requests_matched']} requests in {report['seconds']:.3f}s")
+
+if __name__ == "__main__":
+    main()
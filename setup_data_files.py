@@ -8,13 +8,13 @@ if not os.path.exists('data'):
 
 # CSV field definitions
 CSV_FIELDS = {
-    'donors': ['id', 'name', 'email', 'phone', 'age', 'gender', 'city', 'address', 
+    'donors': ['id', 'name', 'email', 'phone', 'age', 'gender', 'city', 'address', 'lat', 'lon',
                'blood_group', 'organs', 'medical_history', 'last_donation', 'available', 'registered_date'],
     'recipients': ['id', 'name', 'email', 'phone', 'age', 'gender', 'city', 'address', 
                    'blood_group', 'organ_needed', 'urgency', 'registered_date'],
     'blood_banks': ['id', 'name', 'city', 'address', 'phone', 'email', 'contact_person'],
     'active_requests': ['id', 'patient_name', 'contact_person', 'phone', 'email', 'city', 
-                        'hospital', 'type', 'blood_group', 'organ', 'urgency', 'quantity', 
+                        'hospital', 'lat', 'lon', 'type', 'blood_group', 'organ', 'urgency', 'quantity', 
                         'max_distance', 'additional_info', 'status', 'matched_donor', 'created_date'],
     'notifications': ['id', 'donor_id', 'request_id', 'message', 'distance', 'timestamp', 'status'],
     'accepted_matches': ['id', 'donor_id', 'request_id', 'matched_date', 'status']
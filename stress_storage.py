@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+LifeLink - multi-process storage stress test
+Runs several worker processes against one data directory, each hammering
+submit_donor, submit_request and accept_request through the Flask test
+client while another process compacts the tables, then checks that no
+rows were lost, duplicated or left half-written, and that no request was
+matched twice.
+
+Usage: python stress_storage.py [--workers N] [--rounds N]
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _import_app():
+    """Import the app from the repository while working in the test data directory"""
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    import blood_donation_app_csv
+    return blood_donation_app_csv
+
+def _worker(worker_id, rounds, results):
+    """Register one donor, then submit and accept requests in a loop"""
+    lifelink = _import_app()
+    client = lifelink.app.test_client()
+
+    client.post('/submit_donor', data={
+        'name': f'Stress Donor {worker_id}', 'email': f'donor{worker_id}@example.com',
+        'phone': '+91-9000000000', 'age': '30', 'gender': 'Female', 'city': 'Mumbai',
+        'address': 'Line 1\nLine 2', 'blood_group': 'O-', 'organs': ['Kidney']
+    })
+    with client.session_transaction() as session:
+        donor_id = session['donor_id']
+
+    accepted = []
+    for round_number in range(rounds):
+        client.post('/submit_request', data={
+            'patient_name': f'Patient {worker_id}-{round_number}', 'contact_person': 'Stress',
+            'phone': '+91-9000000001', 'email': 'stress@example.com', 'city': 'Thane',
+            'hospital': 'Stress Hospital', 'type': 'blood', 'urgency': 'critical',
+            'quantity': '1', 'max_distance': '50', 'blood_group': 'O-'
+        })
+        lifelink.drain_notification_queue()
+
+        pending = [notification for notification in lifelink.read_notifications_for_donor(donor_id)
+                   if notification['status'] == 'pending']
+        if pending:
+            notification = pending[0]
+            client.post('/accept_request', data={
+                'request_id': notification['request_id'],
+                'notification_id': notification['id']
+            })
+            # Another worker may have matched the request first
+            if lifelink.read_csv_record('notifications', notification['id'])['status'] == 'accepted':
+                accepted.append(notification['id'])
+
+    lifelink.drain_notification_queue()
+    results.put((worker_id, donor_id, accepted))
+
+def _compactor(stop):
+    """Keep compacting every table until told to stop"""
+    lifelink = _import_app()
+    while not stop.is_set():
+        lifelink.compact_all_tables(archive_after_days=3650, force=True)
+        time.sleep(0.01)
+
+def _check_complete_rows(lifelink):
+    """Every line of every table must parse into the full set of columns"""
+    problems = []
+    for file_type, filepath in lifelink.CSV_FILES.items():
+        with open(filepath, 'r', newline='', encoding='utf-8') as csvfile:
+            for line_number, row in enumerate(csv.reader(csvfile), 1):
+                if len(row) != len(lifelink.CSV_FIELDS[file_type]):
+                    problems.append(f"{filepath} row {line_number} has {len(row)} columns")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress test LifeLink storage with concurrent processes")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=25)
+    args = parser.parse_args()
+
+    data_root = tempfile.mkdtemp(prefix='lifelink-stress-')
+    os.chdir(data_root)
+    print(f"Stress testing in {data_root} with {args.workers} workers x {args.rounds} rounds")
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    stop = context.Event()
+    compactor = context.Process(target=_compactor, args=(stop,))
+    workers = [context.Process(target=_worker, args=(worker_id, args.rounds, results))
+               for worker_id in range(args.workers)]
+
+    started = time.perf_counter()
+    compactor.start()
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    stop.set()
+    compactor.join()
+    elapsed = time.perf_counter() - started
+
+    lifelink = _import_app()
+    lifelink.compact_all_tables(archive_after_days=3650, force=True)
+    donors = lifelink.read_csv_data('donors')
+    requests = lifelink.read_csv_data('active_requests')
+    notifications = lifelink.read_csv_data('notifications')
+    matches = lifelink.read_csv_data('accepted_matches')
+
+    failures = _check_complete_rows(lifelink)
+    accepted_ids = [notification_id for _, _, accepted in outcomes for notification_id in accepted]
+    if len(donors) != args.workers:
+        failures.append(f"expected {args.workers} donors, found {len(donors)}")
+    if len(requests) != args.workers * args.rounds:
+        failures.append(f"expected {args.workers * args.rounds} requests, found {len(requests)}")
+    if len(matches) != len(accepted_ids):
+        failures.append(f"expected {len(accepted_ids)} accepted matches, found {len(matches)}")
+    for notification_id in accepted_ids:
+        if notifications.get(notification_id, {}).get('status') != 'accepted':
+            failures.append(f"notification {notification_id} lost its accepted status")
+    matched_requests = [match['request_id'] for match in matches.values()]
+    if len(matched_requests) != len(set(matched_requests)):
+        failures.append(f"{len(matched_requests) - len(set(matched_requests))} requests matched more than once")
+    pairs = [(n['donor_id'], n['request_id']) for n in notifications.values()]
+    if len(pairs) != len(set(pairs)):
+        failures.append(f"{len(pairs) - len(set(pairs))} duplicate notifications")
+
+    print(f"{len(donors)} donors, {len(requests)} requests, {len(notifications)} notifications, "
+          f"{len(matches)} matches in {elapsed:.2f}s")
+    if failures:
+        print("FAILED")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("OK: no rows lost, duplicated or torn")
+
+if __name__ == "__main__":
+    main()